@@ -5,6 +5,10 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
+
+The async dashboard views under ``/api/async/`` (see ``reports.views_async``)
+run their aggregate queries concurrently and should be served from here, e.g.
+``uvicorn backend.asgi:application``.
 """
 
 import os
@@ -133,6 +133,10 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'reports.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 
 # dj-rest-auth settings
@@ -157,10 +161,69 @@ STATICFILES_DIRS = [
     BASE_DIR / 'static'
 ]
 
+# Worker threads used by the async dashboard endpoints to run aggregate
+# queries concurrently. Each worker keeps one database connection open and
+# reconnects after DASHBOARD_CONNECTION_MAX_AGE seconds (CONN_MAX_AGE does not
+# apply to these threads).
+DASHBOARD_QUERY_WORKERS = 5
+DASHBOARD_CONNECTION_MAX_AGE = 300
+
+# Seconds to cache each SLA analytics query result
+SLA_ANALYTICS_CACHE_TIMEOUT = 300
+
+# Open reports older than this many days show up in the overdue triage queue
+TRIAGE_OVERDUE_DAYS = 7
+
+# Duplicate detection on report submission: reports in the same or adjacent
+# grid cells, created within the window, with similar text are flagged.
+DUPLICATE_GRID_SIZE_DEGREES = 0.005
+DUPLICATE_WINDOW_DAYS = 14
+DUPLICATE_SIMILARITY_THRESHOLD = 0.5
+DUPLICATE_MAX_CANDIDATES = 200
+
+# Upper bound on reports touched by one bulk update request
+BULK_UPDATE_MAX_REPORTS = 5000
+
+# Delta sync (/api/sync/): change log entries per page, how long new entries
+# are held back so concurrent commits settle, and how long tombstones (and
+# therefore sync tokens) are kept; see `manage.py compact_changelog`
+SYNC_PAGE_SIZE = 500
+SYNC_SETTLE_SECONDS = 5
+SYNC_TOMBSTONE_RETENTION_DAYS = 30
+
+# Shared by every worker process; the category cache relies on it to notice
+# changes made elsewhere. Create the table with `python manage.py createcachetable`.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'django_cache',
+    }
+}
+
+# Categories are cached in each process and reloaded when another process
+# changes them. Seconds between checks for such changes, hard limit on the age
+# of a process's copy, and lifetime of the cached per-reporter category sets.
+REFERENCE_CACHE_CHECK_SECONDS = 5
+REFERENCE_CACHE_MAX_AGE = 300
+REFERENCE_CACHE_TIMEOUT = 300
+
 # Media files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Unreferenced content-addressed media blobs are kept this long before
+# `manage.py gc_media` deletes them
+MEDIA_BLOB_GC_GRACE_SECONDS = 3600
+
+# Media delivery: after the access check the transfer can be handed to the
+# front proxy. Set MEDIA_ACCEL_REDIRECT_PREFIX to an nginx `internal` location
+# aliased to MEDIA_ROOT (e.g. '/protected-media/'), or MEDIA_SENDFILE = True
+# for Apache mod_xsendfile / lighttpd. Content-addressed files never change
+# and are cached for MEDIA_CACHE_MAX_AGE seconds.
+MEDIA_ACCEL_REDIRECT_PREFIX = None
+MEDIA_SENDFILE = False
+MEDIA_CACHE_MAX_AGE = 31536000
+
 # Email backend
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
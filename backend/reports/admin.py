@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Report, Category, ReportImage, ReportVideo, Comment, ReportSubscription
+from .models import Report, Category, ReportImage, ReportVideo, Comment, ReportSubscription, StatusTransition, ArchivedReport, MediaBlob, ChangeLog
 # Register your models here.
 admin.site.register(Report)
 admin.site.register(Category)
@@ -7,3 +7,7 @@ admin.site.register(ReportImage)
 admin.site.register(ReportVideo)
 admin.site.register(Comment)
 admin.site.register(ReportSubscription)
+admin.site.register(StatusTransition)
+admin.site.register(ArchivedReport)
+admin.site.register(MediaBlob)
+admin.site.register(ChangeLog)
@@ -0,0 +1,140 @@
+"""
+Resolution-time SLA analytics over the ``StatusTransition`` log, which also
+keeps the transitions of archived reports.
+
+Durations are pulled as compact ``values_list`` rows (group key, seconds) and
+the percentiles are computed with NumPy rather than in Python loops. Results
+are cached per query for ``SLA_ANALYTICS_CACHE_TIMEOUT`` seconds. NumPy is
+optional: without it ``sla_analytics`` raises ``AnalyticsUnavailable``.
+"""
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import StatusTransition
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is optional
+    np = None
+
+PERCENTILES = (50, 90, 99)
+
+# Transitions of archived reports point at ArchivedReport instead of Report
+GROUP_FIELDS = {
+    name: Coalesce(f'report__{path}', f'archived_report__{path}')
+    for name, path in (
+        ('category', 'category__name'),
+        ('severity', 'severity'),
+        ('priority', 'priority'),
+        ('assigned_to', 'assigned_to__username'),
+    )
+}
+
+# States a report waits in before it is resolved or rejected
+OPEN_STATES = ('pending', 'investigating', 'in_progress')
+
+
+class AnalyticsUnavailable(Exception):
+    pass
+
+
+def _parse_day(value, name):
+    if not value:
+        return None
+    day = parse_date(value)
+    if day is None:
+        raise ValueError(f"Invalid {name} date, expected YYYY-MM-DD")
+    return day
+
+
+def _percentile_rows(rows, grouped):
+    """Summarise (key, seconds) rows into count and percentiles per key"""
+    if grouped:
+        rows = list(rows)
+        if not rows:
+            return []
+        keys, values = zip(*rows)
+    else:
+        values = list(rows)
+        if not values:
+            return []
+        keys = (None,) * len(values)
+
+    index = {}
+    codes = np.fromiter((index.setdefault(key, len(index)) for key in keys), dtype=np.intp, count=len(keys))
+    seconds = np.fromiter(values, dtype=np.float64, count=len(values))
+
+    order = np.argsort(codes, kind='stable')
+    bounds = np.cumsum(np.bincount(codes, minlength=len(index)))
+    groups = np.split(seconds[order], bounds[:-1])
+
+    results = []
+    for key, group in zip(index, groups):
+        p50, p90, p99 = np.percentile(group, PERCENTILES)
+        results.append({
+            'key': key,
+            'count': int(group.size),
+            'p50': float(p50),
+            'p90': float(p90),
+            'p99': float(p99),
+        })
+    results.sort(key=lambda row: row['count'], reverse=True)
+    return results
+
+
+def sla_analytics(group_by=None, start=None, end=None):
+    """p50/p90/p99 time-to-resolve and time-in-state in seconds.
+
+    ``group_by`` is one of ``GROUP_FIELDS`` (or empty for overall figures) and
+    ``start``/``end`` are inclusive ``YYYY-MM-DD`` bounds on the transition time.
+    """
+    if np is None:
+        raise AnalyticsUnavailable('SLA analytics require NumPy, which is not installed')
+    if group_by and group_by not in GROUP_FIELDS:
+        raise ValueError(f"group_by must be one of: {', '.join(GROUP_FIELDS)}")
+    start_day = _parse_day(start, 'start')
+    end_day = _parse_day(end, 'end')
+
+    cache_key = f"sla-analytics:{group_by or ''}:{start_day or ''}:{end_day or ''}"
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    transitions = StatusTransition.objects.all()
+    if start_day:
+        transitions = transitions.filter(
+            changed_at__gte=timezone.make_aware(datetime.combine(start_day, time.min))
+        )
+    if end_day:
+        transitions = transitions.filter(
+            changed_at__lt=timezone.make_aware(datetime.combine(end_day + timedelta(days=1), time.min))
+        )
+
+    group_field = GROUP_FIELDS.get(group_by)
+
+    def durations(queryset, metric):
+        queryset = queryset.filter(**{f'{metric}__isnull': False})
+        if group_field:
+            rows = queryset.annotate(group_key=group_field).values_list('group_key', metric)
+            return _percentile_rows(rows.iterator(), True)
+        return _percentile_rows(queryset.values_list(metric, flat=True).iterator(), False)
+
+    result = {
+        'group_by': group_by or None,
+        'start': str(start_day) if start_day else None,
+        'end': str(end_day) if end_day else None,
+        'time_to_resolve': durations(
+            transitions.filter(to_status='resolved'), 'seconds_since_created'
+        ),
+        'time_in_state': {
+            state: durations(transitions.filter(from_status=state), 'seconds_in_from_status')
+            for state in OPEN_STATES
+        },
+    }
+    cache.set(cache_key, result, getattr(settings, 'SLA_ANALYTICS_CACHE_TIMEOUT', 300))
+    return result
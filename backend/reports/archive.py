@@ -0,0 +1,320 @@
+"""
+Hot/cold archival of closed reports.
+
+``archive_reports`` moves resolved/rejected reports, with their comments,
+images, videos and subscriptions, into ``ArchivedReport`` rows and deletes
+them from the hot tables, keeping ``Report`` and its indexes small. Status
+transitions stay in place, re-pointed at the archived report, because SLA
+analytics aggregate over all of them. ``restore_reports`` reverses the move using Django's raw deserializer,
+so primary keys and timestamps (including ``auto_now`` fields) come back
+unchanged. ``archived_report_data`` renders an archived report in the same
+shape as ``ReportSerializer``; ``archived_reports_data`` renders a page of
+them with their users and categories loaded in bulk.
+"""
+from collections import defaultdict
+
+from django.contrib.auth.models import User
+from django.core import serializers as model_serializers
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import blobs
+from .models import (
+    ArchivedMedia, ArchivedReport, Category, Comment, Report, ReportImage, ReportSubscription,
+    ReportVideo, StatusTransition
+)
+from .serializers import (
+    CommentSerializer, ReportImageSerializer, ReportSerializer,
+    ReportVideoSerializer, UserSerializer, relation_requested
+)
+
+# Child tables moved along with each report, in restore order
+ARCHIVED_RELATIONS = (
+    ('comments', Comment),
+    ('images', ReportImage),
+    ('videos', ReportVideo),
+    ('subscriptions', ReportSubscription),
+)
+
+_MANY_RELATIONS = {'images', 'videos', 'comments'}
+_COMMENT_SCALAR_FIELDS = {
+    'id', 'content', 'created_at', 'updated_at', 'is_staff_response',
+    'parent', 'edited', 'is_hidden'
+}
+
+
+def archivable_reports(older_than):
+    """Closed reports not updated since ``older_than``"""
+    return Report.objects.filter(
+        status__in=ArchivedReport.CLOSED_STATUSES,
+        updated_at__lt=older_than,
+    )
+
+
+def archive_reports(report_ids, older_than):
+    """Move the given reports to the archive if they are still archivable.
+
+    Returns the ids that were archived.
+    """
+    with transaction.atomic():
+        reports = list(
+            archivable_reports(older_than).filter(id__in=report_ids)
+            .select_for_update().prefetch_related('upvotes')
+        )
+        if not reports:
+            return []
+        ids = [report.id for report in reports]
+
+        children = {}
+        for name, model in ARCHIVED_RELATIONS:
+            grouped = defaultdict(list)
+            queryset = model.objects.filter(report_id__in=ids).order_by('pk').prefetch_related(
+                *(field.name for field in model._meta.many_to_many)
+            )
+            rows = model_serializers.serialize('python', queryset)
+            for row in rows:
+                grouped[row['fields']['report']].append(row)
+            children[name] = grouped
+
+        now = timezone.now()
+        ArchivedReport.objects.bulk_create([
+            ArchivedReport(
+                id=report.id,
+                title=report.title,
+                description=report.description,
+                location_name=report.location_name,
+                category_id=report.category_id,
+                reporter_id=report.reporter_id,
+                status=report.status,
+                severity=report.severity,
+                priority=report.priority,
+                assigned_to_id=report.assigned_to_id,
+                is_public=report.is_public,
+                created_at=report.created_at,
+                updated_at=report.updated_at,
+                archived_at=now,
+                data={
+                    'report': model_serializers.serialize('python', [report]),
+                    **{name: children[name].get(report.id, []) for name, _ in ARCHIVED_RELATIONS},
+                },
+            )
+            for report in reports
+        ])
+        # The archive keeps its own reference to each media blob so the
+        # post_delete release below does not leave the files collectable;
+        # deleting the ArchivedReport releases it (see signals).
+        for name in _media_names(children):
+            blobs.acquire(name)
+        ArchivedMedia.objects.bulk_create([
+            ArchivedMedia(archived_report_id=report_id, name=name)
+            for report_id, name in _media_names(children, with_report=True)
+        ])
+        # SET evaluates against the old row, so archived_report takes the old report_id
+        StatusTransition.objects.filter(report_id__in=ids).update(
+            report=None, archived_report_id=F('report_id')
+        )
+        # Cascades to the child rows copied above
+        Report.objects.filter(id__in=ids).delete()
+    return ids
+
+
+def _media_names(children, with_report=False):
+    """Stored file names in grouped image/video rows, optionally with their report id"""
+    for relation, field in (('images', 'image'), ('videos', 'video')):
+        for report_id, rows in children[relation].items():
+            for row in rows:
+                name = row['fields'][field]
+                if name:
+                    yield (report_id, name) if with_report else name
+
+
+def archived_media_names(entry, with_report=False):
+    """Stored media file names of an archived report, optionally with its id"""
+    return _media_names({
+        relation: {entry.id: entry.data.get(relation, [])} for relation in ('images', 'videos')
+    }, with_report=with_report)
+
+
+def restore_reports(report_ids):
+    """Move archived reports back into the hot tables. Returns the restored ids."""
+    with transaction.atomic():
+        archived = list(ArchivedReport.objects.filter(id__in=report_ids).select_for_update())
+        for entry in archived:
+            # Restored media rows take fresh references in post_save, and
+            # deleting the entry below releases the archive's own
+            for restored in _restorable_objects(entry):
+                restored.save()
+        ids = [entry.id for entry in archived]
+        StatusTransition.objects.filter(archived_report_id__in=ids).update(
+            report_id=F('archived_report_id'), archived_report=None
+        )
+        ArchivedReport.objects.filter(id__in=ids).delete()
+    return ids
+
+
+def index_archived_media(entries):
+    """(Re)build the ``ArchivedMedia`` rows of the given archived reports"""
+    entries = list(entries)
+    ArchivedMedia.objects.filter(archived_report__in=entries).delete()
+    return len(ArchivedMedia.objects.bulk_create([
+        ArchivedMedia(archived_report_id=report_id, name=name)
+        for entry in entries
+        for report_id, name in archived_media_names(entry, with_report=True)
+    ]))
+
+
+def _deserialized(rows):
+    return list(model_serializers.deserialize('python', rows))
+
+
+def _restorable_objects(entry):
+    """Deserialized rows of an archived report in insert order.
+
+    Users and categories may have been deleted while the report sat in the
+    archive: references to them are cleared, or the dependent rows dropped
+    the way the original cascades would have.
+    """
+    report = _deserialized(entry.data['report'])[0]
+    related = {name: _deserialized(entry.data.get(name, [])) for name, _ in ARCHIVED_RELATIONS}
+
+    user_ids = {report.object.reporter_id, report.object.assigned_to_id}
+    user_ids.update(report.m2m_data.get('upvotes', ()))
+    for name in ('comments', 'subscriptions'):
+        for restored in related[name]:
+            user_ids.add(restored.object.user_id)
+            user_ids.update(restored.m2m_data.get('helpful_votes', ()))
+    existing = set(User.objects.filter(id__in=user_ids - {None}).values_list('id', flat=True))
+
+    report.object.category_id = entry.category_id
+    if report.object.assigned_to_id not in existing:
+        report.object.assigned_to_id = None
+
+    kept_comments = set()
+    comments = []
+    for restored in sorted(related['comments'], key=lambda item: item.object.created_at):
+        comment = restored.object
+        if comment.user_id in existing and (comment.parent_id is None or comment.parent_id in kept_comments):
+            kept_comments.add(comment.pk)
+            comments.append(restored)
+    related['comments'] = comments
+    related['subscriptions'] = [
+        restored for restored in related['subscriptions'] if restored.object.user_id in existing
+    ]
+
+    for restored in [report] + comments:
+        for name, values in restored.m2m_data.items():
+            restored.m2m_data[name] = [value for value in values if value in existing]
+
+    objects = [report]
+    for name, _ in ARCHIVED_RELATIONS:
+        objects.extend(related[name])
+    # Archives written while transitions were still moved into the snapshot
+    objects.extend(_deserialized(entry.data.get('status_transitions', [])))
+    return objects
+
+
+def _archived_comments(entries, context, users=None):
+    """Comments of an archived report, shaped like ``CommentSerializer`` output"""
+    request = context.get('request')
+    user = getattr(request, 'user', None)
+    authenticated = user is not None and user.is_authenticated
+
+    comments = sorted((entry.object for entry in entries), key=lambda c: c.created_at, reverse=True)
+    votes = {entry.object.pk: set(entry.m2m_data.get('helpful_votes', ())) for entry in entries}
+    if users is None:
+        users = User.objects.in_bulk({comment.user_id for comment in comments})
+    children = defaultdict(list)
+    for comment in comments:
+        children[comment.parent_id].append(comment)
+
+    order = list(CommentSerializer().fields)
+
+    def render(comment):
+        data = CommentSerializer(comment, context=context, fields=_COMMENT_SCALAR_FIELDS).data
+        author = users.get(comment.user_id)
+        can_change = authenticated and (comment.user_id == user.pk or user.is_staff)
+        data.update({
+            'user': UserSerializer(author).data if author else None,
+            'helpful_count': len(votes.get(comment.pk, ())),
+            'has_voted': authenticated and user.pk in votes.get(comment.pk, ()),
+            'can_edit': can_change,
+            'can_delete': can_change,
+            'replies': [render(reply) for reply in children.get(comment.pk, ())],
+        })
+        return {name: data[name] for name in order}
+
+    return [render(comment) for comment in comments]
+
+
+def _wanted_relations(fields, expand):
+    return {
+        name for name in {'reporter', 'category'} | _MANY_RELATIONS
+        if relation_requested(name, fields, expand)
+    }
+
+
+def archived_reports_data(entries, context=None, fields=None, expand=None):
+    """Render archived reports, loading users and categories with one query each"""
+    entries = list(entries)
+    wanted = _wanted_relations(fields, expand)
+    user_ids = set()
+    if 'reporter' in wanted:
+        user_ids.update(entry.reporter_id for entry in entries)
+    if 'comments' in wanted:
+        for entry in entries:
+            user_ids.update(row['fields']['user'] for row in entry.data.get('comments', []))
+    users = User.objects.in_bulk(user_ids) if user_ids else {}
+    category_ids = {entry.category_id for entry in entries} - {None} if 'category' in wanted else set()
+    categories = Category.objects.in_bulk(category_ids) if category_ids else {}
+    return [
+        archived_report_data(entry, context, fields, expand, users=users, categories=categories)
+        for entry in entries
+    ]
+
+
+def archived_report_data(archived, context=None, fields=None, expand=None, users=None, categories=None):
+    """Render an ``ArchivedReport`` in the ``ReportSerializer`` contract.
+
+    ``users``/``categories`` are preloaded objects by id; without them the
+    relations are fetched for this report alone.
+    """
+    context = context or {}
+    report_entry = _deserialized(archived.data['report'])[0]
+    report_entry.object.category_id = archived.category_id
+    wanted = _wanted_relations(fields, expand)
+    if users is not None and report_entry.object.reporter_id in users:
+        report_entry.object.reporter = users[report_entry.object.reporter_id]
+    if categories is not None and archived.category_id in categories:
+        report_entry.object.category = categories[archived.category_id]
+
+    # Serialize scalars and foreign keys from the in-memory instance; the
+    # reverse relations no longer exist in the hot tables and are added below.
+    data = dict(ReportSerializer(
+        report_entry.object, context=context,
+        fields=None if fields is None else set(fields) - _MANY_RELATIONS,
+        expand=wanted - _MANY_RELATIONS,
+    ).data)
+
+    if 'images' in wanted:
+        images = sorted(
+            (entry.object for entry in _deserialized(archived.data.get('images', []))),
+            key=lambda image: (not image.is_primary, -image.uploaded_at.timestamp())
+        )
+        data['images'] = ReportImageSerializer(images, many=True, context=context).data
+    if 'videos' in wanted:
+        videos = sorted(
+            (entry.object for entry in _deserialized(archived.data.get('videos', []))),
+            key=lambda video: video.uploaded_at, reverse=True
+        )
+        data['videos'] = ReportVideoSerializer(videos, many=True, context=context).data
+    if 'comments' in wanted:
+        data['comments'] = _archived_comments(_deserialized(archived.data.get('comments', [])), context, users)
+
+    order = [
+        name for name, field in ReportSerializer(fields=fields, expand=expand).fields.items()
+        if not field.write_only
+    ]
+    result = {name: data[name] for name in order if name in data}
+    result['archived'] = True
+    return result
@@ -0,0 +1,93 @@
+"""
+Reference counting and garbage collection for content-addressed media blobs.
+
+``acquire``/``release`` are called from the media row signal handlers (and by
+the archive, which keeps references for archived rows). A blob whose count
+drops to zero is only marked orphaned; ``collect_garbage`` deletes orphaned
+blobs after a grace period. Both ``acquire`` and ``collect_garbage`` lock the
+blob's row, and ``acquire`` stores the bytes again if the collector removed
+the file after the upload found it, so a media row never points at a
+deleted file.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import MediaBlob
+from .storage import blob_digest, blob_key, is_blob_name, media_storage
+
+
+def _locked(key):
+    return MediaBlob.objects.select_for_update().filter(name=key).first()
+
+
+def acquire(name, count=1, content=None):
+    """Count ``count`` new references to the blob stored under ``name``.
+
+    ``content`` is the uploaded file, stored again when the blob was
+    collected between the upload and this call.
+    """
+    if not is_blob_name(name):
+        return
+    key = blob_key(name)
+    with transaction.atomic():
+        blob = _locked(key)
+        while blob is None:
+            MediaBlob.objects.get_or_create(name=key, defaults={'digest': blob_digest(name)})
+            # Lock it, even when another transaction created it first
+            blob = _locked(key)
+
+        if content is not None and not media_storage.exists(name):
+            try:
+                stored = media_storage.save(name, content)
+            except FileNotFoundError:
+                # Not an upload: ``content`` reads from the missing blob itself
+                stored = key
+            if blob_key(stored) != key:
+                raise ValueError(f'{name} does not match the content stored again as {stored}')
+        changes = {'ref_count': F('ref_count') + count, 'orphaned_at': None}
+        if blob.size is None and media_storage.exists(name):
+            changes['size'] = media_storage.size(name)
+        if MediaBlob.objects.filter(pk=blob.pk).update(**changes) != 1:
+            raise MediaBlob.DoesNotExist(f'Blob {key} disappeared while locked')
+
+
+def release(name, count=1):
+    """Drop ``count`` references to the blob stored under ``name``"""
+    if not is_blob_name(name):
+        return
+    key = blob_key(name)
+    MediaBlob.objects.filter(name=key).update(ref_count=F('ref_count') - count)
+    MediaBlob.objects.filter(name=key, ref_count__lte=0, orphaned_at__isnull=True).update(
+        orphaned_at=timezone.now()
+    )
+
+
+def collect_garbage(grace=None):
+    """Delete blobs that have been unreferenced for longer than ``grace``.
+
+    Returns ``(blobs_deleted, bytes_freed)``.
+    """
+    if grace is None:
+        grace = timedelta(seconds=getattr(settings, 'MEDIA_BLOB_GC_GRACE_SECONDS', 3600))
+    cutoff = timezone.now() - grace
+
+    deleted = freed = 0
+    candidates = MediaBlob.objects.filter(ref_count__lte=0, orphaned_at__lt=cutoff)
+    for pk in candidates.values_list('pk', flat=True).iterator():
+        with transaction.atomic():
+            blob = candidates.select_for_update(skip_locked=True).filter(pk=pk).first()
+            if blob is None:
+                continue
+            if media_storage.exists(blob.name):
+                if media_storage.get_modified_time(blob.name) >= cutoff:
+                    # Re-uploaded during the grace period; acquire() will follow
+                    continue
+                media_storage.delete(blob.name)
+            blob.delete()
+        deleted += 1
+        freed += blob.size or 0
+    return deleted, freed
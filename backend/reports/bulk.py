@@ -0,0 +1,88 @@
+"""
+Set-based bulk updates of reports for staff.
+
+Instead of one ``Report.save`` per row, a bulk request runs a handful of
+``UPDATE`` statements inside a single transaction while keeping the
+``Report.save`` semantics: ``resolved_at``/``resolution_time_days`` are
+computed in SQL for newly resolved rows and status changes are appended to
+the ``StatusTransition`` log in one insert. Queryset updates send no model
+signals, so the touched reports are logged for delta sync explicitly.
+"""
+from django.db import transaction
+from django.db.models import DateTimeField, DurationField, ExpressionWrapper, F, Max, Value
+from django.db.models.functions import ExtractDay
+from django.utils import timezone
+
+from .models import Report, StatusTransition
+from .sync import record_changes
+
+BULK_FIELDS = ('status', 'assigned_to', 'priority', 'verified', 'verification_notes')
+
+
+class BulkUpdateTooLarge(ValueError):
+    pass
+
+
+def bulk_update_reports(queryset, changes, requested_ids=None, max_reports=None):
+    """Apply ``changes`` to every report in ``queryset``.
+
+    Returns ``(updated_count, outcomes)`` where ``outcomes`` lists each report
+    as ``updated``, ``resolved`` (newly resolved) or, for ``requested_ids``
+    that matched nothing, ``not_found``. Raises ``BulkUpdateTooLarge``, without
+    changing anything, when more than ``max_reports`` reports match.
+    """
+    changes = {field: value for field, value in changes.items() if field in BULK_FIELDS}
+    new_status = changes.get('status')
+    now = timezone.now()
+
+    with transaction.atomic():
+        locked = queryset.order_by('id').select_for_update().values_list('id', 'status', 'created_at', 'resolved_at')
+        if max_reports is not None:
+            # Checked on the locked rows: a filter can match more rows by now
+            # than a count taken before the transaction did.
+            locked = locked[:max_reports + 1]
+        rows = list(locked)
+        if max_reports is not None and len(rows) > max_reports:
+            raise BulkUpdateTooLarge(f"Bulk updates are limited to {max_reports} reports")
+        ids = [row[0] for row in rows]
+        newly_resolved = set()
+
+        if ids:
+            Report.objects.filter(id__in=ids).update(updated_at=now, **changes)
+            record_changes('report', ids)
+
+            if new_status == 'resolved':
+                newly_resolved = {row[0] for row in rows if row[3] is None}
+                Report.objects.filter(id__in=newly_resolved).update(
+                    resolved_at=now,
+                    resolution_time_days=ExtractDay(ExpressionWrapper(
+                        Value(now, output_field=DateTimeField()) - F('created_at'),
+                        output_field=DurationField()
+                    )),
+                )
+
+            if new_status:
+                changed = [row for row in rows if row[1] != new_status]
+                last_changed = dict(
+                    StatusTransition.objects.filter(report_id__in=[row[0] for row in changed])
+                    .values('report_id').annotate(last=Max('changed_at'))
+                    .values_list('report_id', 'last')
+                )
+                StatusTransition.objects.bulk_create([
+                    StatusTransition.build(
+                        report_id, created_at, from_status, new_status, now, last_changed.get(report_id)
+                    )
+                    for report_id, from_status, created_at, _ in changed
+                ])
+
+    outcomes = [
+        {'id': report_id, 'outcome': 'resolved' if report_id in newly_resolved else 'updated'}
+        for report_id in ids
+    ]
+    if requested_ids is not None:
+        found = set(ids)
+        outcomes += [
+            {'id': report_id, 'outcome': 'not_found'}
+            for report_id in dict.fromkeys(requested_ids) if report_id not in found
+        ]
+    return len(ids), outcomes
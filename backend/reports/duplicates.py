@@ -0,0 +1,116 @@
+"""
+Near-duplicate detection for newly submitted reports.
+
+Every report stores a spatial ``grid_key`` (the lat/lon cell it falls in) and
+a MinHash ``text_signature`` over the character trigrams of its title and
+description. Candidates for a new report are the recent open reports in its
+own and the eight surrounding cells, fetched through the
+``(grid_key, created_at)`` index, so the lookup cost depends on local report
+density rather than table size. Candidates are then ranked by the estimated
+Jaccard similarity of their signatures.
+"""
+import math
+import random
+import re
+from datetime import timedelta
+from hashlib import blake2b
+
+from django.conf import settings
+
+SIGNATURE_SIZE = 32
+_MERSENNE_PRIME = (1 << 61) - 1
+
+# Fixed seed: signatures are persisted, so the permutations must never change
+_rng = random.Random(0x5EED)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(SIGNATURE_SIZE)
+]
+
+_NON_WORD = re.compile(r'[\W_]+')
+
+
+def _grid_size():
+    # Degrees per cell, ~500m of latitude by default
+    return getattr(settings, 'DUPLICATE_GRID_SIZE_DEGREES', 0.005)
+
+
+def _grid_cell(latitude, longitude):
+    size = _grid_size()
+    return math.floor(float(latitude) / size), math.floor(float(longitude) / size)
+
+
+def grid_key(latitude, longitude):
+    """Key of the grid cell containing the given coordinates"""
+    row, col = _grid_cell(latitude, longitude)
+    return f"{row}:{col}"
+
+
+def neighbour_keys(latitude, longitude):
+    """Keys of the cell containing the coordinates and the eight around it"""
+    row, col = _grid_cell(latitude, longitude)
+    return [
+        f"{row + d_row}:{col + d_col}"
+        for d_row in (-1, 0, 1)
+        for d_col in (-1, 0, 1)
+    ]
+
+
+def _shingles(text):
+    normalized = _NON_WORD.sub(' ', text.lower()).strip()
+    return {normalized[i:i + 3] for i in range(len(normalized) - 2)}
+
+
+def text_signature(text):
+    """MinHash signature over the character trigrams of ``text``"""
+    shingles = _shingles(text)
+    if not shingles:
+        return []
+    hashes = [
+        int.from_bytes(blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big')
+        for shingle in shingles
+    ]
+    return [
+        min((a * value + b) % _MERSENNE_PRIME for value in hashes)
+        for a, b in _PERMUTATIONS
+    ]
+
+
+def similarity(signature, other):
+    """Estimated Jaccard similarity of two signatures"""
+    if not signature or len(signature) != len(other):
+        return 0.0
+    return sum(1 for a, b in zip(signature, other) if a == b) / len(signature)
+
+
+def find_duplicates(report, limit=5):
+    """Recent open reports near ``report`` whose text looks like the same issue"""
+    from .models import Report
+
+    if not report.text_signature:
+        return []
+
+    window = timedelta(days=getattr(settings, 'DUPLICATE_WINDOW_DAYS', 14))
+    threshold = getattr(settings, 'DUPLICATE_SIMILARITY_THRESHOLD', 0.5)
+    max_candidates = getattr(settings, 'DUPLICATE_MAX_CANDIDATES', 200)
+
+    candidates = (
+        Report.objects
+        .filter(
+            grid_key__in=neighbour_keys(report.latitude, report.longitude),
+            created_at__gte=report.created_at - window,
+            status__in=Report.OPEN_STATUSES,
+        )
+        .exclude(pk=report.pk)
+        .order_by('-created_at')
+        .values('id', 'title', 'status', 'created_at', 'text_signature')[:max_candidates]
+    )
+
+    matches = []
+    for candidate in candidates:
+        score = similarity(report.text_signature, candidate.pop('text_signature'))
+        if score >= threshold:
+            candidate['similarity'] = round(score, 3)
+            matches.append(candidate)
+    matches.sort(key=lambda match: match['similarity'], reverse=True)
+    return matches[:limit]
@@ -0,0 +1,229 @@
+"""
+Compiled read-only serialization for large report and comment listings.
+
+``ReportSerializer``/``CommentSerializer`` build a nested serializer per row and
+call every ``SerializerMethodField`` per object. The classes here produce the
+same JSON contract from flat ``values()`` rows instead: each serializer is
+compiled once into a list of per-field converters (reusing the DRF fields'
+own ``to_representation`` where it does real work), nested foreign keys are
+read from joined columns and reverse relations are fetched with one query per
+relation for the whole page. ``?fields=``/``?expand=`` selections are honoured
+because plans are compiled from the pruned serializers.
+"""
+from collections import defaultdict
+from functools import lru_cache
+
+from rest_framework import serializers
+
+from .models import Comment, Report
+from .serializers import CommentSerializer, ReportSerializer
+
+# DRF fields whose to_representation is a no-op for values loaded from the database
+_PASSTHROUGH_FIELDS = (
+    serializers.CharField, serializers.IntegerField,
+    serializers.BooleanField, serializers.ChoiceField,
+)
+
+
+def _selection_key(names):
+    return None if names is None else frozenset(names)
+
+
+def _absolute(url, request):
+    return request.build_absolute_uri(url) if request is not None else url
+
+
+class _Plan:
+    """Column list and per-field getters compiled from a serializer instance"""
+
+    def __init__(self, serializer, prefix=''):
+        self.model = serializer.Meta.model
+        self.columns = []
+        self.steps = []
+        self.many = {}
+        self.methods = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, serializers.ListSerializer):
+                self.many[name] = field.child
+                self.steps.append((name, self._related_getter(name)))
+            elif isinstance(field, serializers.BaseSerializer):
+                self.steps.append((name, self._nested_getter(field, prefix)))
+            elif isinstance(field, serializers.SerializerMethodField):
+                self.methods.append(name)
+                self.steps.append((name, self._method_getter(name)))
+            elif isinstance(field, serializers.FileField):
+                self.steps.append((name, self._file_getter(field, prefix)))
+            elif isinstance(field, serializers.RelatedField):
+                column = prefix + self.model._meta.get_field(field.source).attname
+                self.steps.append((name, self._scalar_getter(column, None)))
+            else:
+                convert = None if isinstance(field, _PASSTHROUGH_FIELDS) else field.to_representation
+                self.steps.append((name, self._scalar_getter(prefix + field.source, convert)))
+
+    def _column(self, column):
+        if column not in self.columns:
+            self.columns.append(column)
+        return column
+
+    def _scalar_getter(self, column, convert):
+        self._column(column)
+        if convert is None:
+            return lambda row, context: row[column]
+
+        def get(row, context):
+            value = row[column]
+            return None if value is None else convert(value)
+        return get
+
+    def _file_getter(self, field, prefix):
+        column = self._column(prefix + field.source)
+        storage = self.model._meta.get_field(field.source).storage
+
+        def get(row, context):
+            name = row[column]
+            return _absolute(storage.url(name), context.request) if name else None
+        return get
+
+    def _nested_getter(self, field, prefix):
+        null_column = self._column(prefix + self.model._meta.get_field(field.source).attname)
+        nested = _Plan(field, prefix=f'{prefix}{field.source}__')
+        for column in nested.columns:
+            self._column(column)
+
+        def get(row, context):
+            return None if row[null_column] is None else nested.render(row, context)
+        return get
+
+    def _related_getter(self, name):
+        return lambda row, context: context.related[name].get(row['id'], [])
+
+    def _method_getter(self, name):
+        return lambda row, context: context.method(name, row)
+
+    def render(self, row, context):
+        return {name: get(row, context) for name, get in self.steps}
+
+
+class _Context:
+    """Per-call state shared by the getters: request, related rows and method hooks"""
+
+    def __init__(self, request, method=None):
+        self.request = request
+        self.related = {}
+        self.method = method
+
+
+class CommentRows:
+    """Compiled equivalent of ``CommentSerializer(..., many=True).data``"""
+
+    def __init__(self, fields=None, expand=None, context=None, plan=None):
+        self.plan = plan or _comment_plan(_selection_key(fields), _selection_key(expand))
+        self.request = (context or {}).get('request')
+        self.columns = list(dict.fromkeys(self.plan.columns + ['id', 'parent_id', 'user_id']))
+
+    def serialize(self, queryset):
+        """Render the comments in ``queryset``, in order, with their replies"""
+        rows = list(queryset.prefetch_related(None).values(*self.columns))
+        return self._render(rows)
+
+    def serialize_for_reports(self, report_ids):
+        """All comments of the given reports grouped by report id, like ``report.comments``"""
+        rows = list(Comment.objects.filter(report_id__in=report_ids).values(*self.columns, 'report_id'))
+        rendered = self._render(rows)
+        grouped = defaultdict(list)
+        for row, data in zip(rows, rendered):
+            grouped[row['report_id']].append(data)
+        return grouped
+
+    def _render(self, rows):
+        by_id = {row['id']: row for row in rows}
+        children = defaultdict(list)
+        if 'replies' in self.plan.methods:
+            # Walk the reply tree one level per query; rows already loaded
+            # are reused so each comment's children are fetched exactly once.
+            frontier = list(by_id)
+            while frontier:
+                found = Comment.objects.filter(parent_id__in=frontier).values(*self.columns)
+                frontier = []
+                for child in found:
+                    known = by_id.get(child['id'])
+                    if known is None:
+                        by_id[child['id']] = known = child
+                        frontier.append(child['id'])
+                    children[known['parent_id']].append(known)
+
+        votes = defaultdict(set)
+        if {'helpful_count', 'has_voted'} & set(self.plan.methods) and by_id:
+            through = Comment.helpful_votes.through.objects.filter(comment_id__in=list(by_id))
+            for comment_id, user_id in through.values_list('comment_id', 'user_id'):
+                votes[comment_id].add(user_id)
+
+        request = self.request
+        user = getattr(request, 'user', None)
+        authenticated = user is not None and user.is_authenticated
+        plan = self.plan
+
+        def method(name, row):
+            if name == 'helpful_count':
+                return len(votes.get(row['id'], ()))
+            if name == 'has_voted':
+                return authenticated and user.pk in votes.get(row['id'], ())
+            if name in ('can_edit', 'can_delete'):
+                return authenticated and (row['user_id'] == user.pk or user.is_staff)
+            if name == 'replies':
+                return [plan.render(child, context) for child in children.get(row['id'], ())]
+            raise ValueError(f"No compiled implementation for CommentSerializer.{name}")
+
+        context = _Context(request, method)
+        return [plan.render(row, context) for row in rows]
+
+
+class ReportRows:
+    """Compiled equivalent of ``ReportSerializer(..., many=True).data``"""
+
+    def __init__(self, fields=None, expand=None, context=None):
+        self.plan = _report_plan(_selection_key(fields), _selection_key(expand))
+        self.context = context or {}
+        self.request = self.context.get('request')
+        self.columns = list(dict.fromkeys(self.plan.columns + ['id']))
+
+    def serialize(self, queryset):
+        """Render the reports in ``queryset``, in order"""
+        rows = list(queryset.prefetch_related(None).values(*self.columns))
+        context = _Context(self.request)
+        report_ids = [row['id'] for row in rows]
+        for name, child in self.plan.many.items():
+            context.related[name] = self._load_related(name, child, report_ids) if report_ids else {}
+        return [self.plan.render(row, context) for row in rows]
+
+    def _load_related(self, name, child, report_ids):
+        if isinstance(child, CommentSerializer):
+            return CommentRows(context=self.context, plan=_comment_plan(None, None)).serialize_for_reports(report_ids)
+
+        plan = _child_plan(name)
+        parent_column = Report._meta.get_field(name).field.attname
+        rows = plan.model.objects.filter(**{f'{parent_column}__in': report_ids}).values(
+            *dict.fromkeys(plan.columns + [parent_column])
+        )
+        context = _Context(self.request)
+        grouped = defaultdict(list)
+        for row in rows:
+            grouped[row[parent_column]].append(plan.render(row, context))
+        return grouped
+
+
+@lru_cache(maxsize=64)
+def _report_plan(fields, expand):
+    return _Plan(ReportSerializer(fields=fields, expand=expand))
+
+
+@lru_cache(maxsize=64)
+def _comment_plan(fields, expand):
+    return _Plan(CommentSerializer(fields=fields, expand=expand))
+
+
+@lru_cache(maxsize=None)
+def _child_plan(name):
+    return _Plan(ReportSerializer().fields[name].child)
@@ -0,0 +1,42 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from reports.archive import archivable_reports, archive_reports
+
+
+class Command(BaseCommand):
+    help = 'Move resolved and rejected reports older than N days into the archive'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, required=True, metavar='DAYS',
+                            help='Archive closed reports not updated for this many days')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true', help='Only count the reports that would be archived')
+
+    def handle(self, *args, **options):
+        if options['older_than'] < 0 or options['batch_size'] < 1:
+            raise CommandError('--older-than must be >= 0 and --batch-size >= 1')
+
+        cutoff = timezone.now() - timedelta(days=options['older_than'])
+        candidates = archivable_reports(cutoff)
+        if options['dry_run']:
+            self.stdout.write(f"{candidates.count()} reports would be archived")
+            return
+
+        archived = 0
+        last_id = 0
+        while True:
+            # Each batch is its own transaction so locks and WAL stay bounded
+            ids = list(
+                candidates.filter(id__gt=last_id).order_by('id')
+                .values_list('id', flat=True)[:options['batch_size']]
+            )
+            if not ids:
+                break
+            last_id = ids[-1]
+            archived += len(archive_reports(ids, cutoff))
+            self.stdout.write(f"Archived {archived} reports so far")
+
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} reports"))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from reports.models import Report
+
+
+class Command(BaseCommand):
+    help = 'Compute duplicate detection fingerprints for reports saved before they existed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--all', action='store_true', help='Recompute every report, not just missing ones')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        queryset = Report.objects.only('id', 'title', 'description', 'latitude', 'longitude').order_by('id')
+        if not options['all']:
+            queryset = queryset.filter(grid_key='')
+
+        updated = 0
+        batch = []
+        for report in queryset.iterator(chunk_size=batch_size):
+            report.refresh_fingerprint()
+            batch.append(report)
+            if len(batch) >= batch_size:
+                Report.objects.bulk_update(batch, ['grid_key', 'text_signature'])
+                updated += len(batch)
+                batch = []
+        if batch:
+            Report.objects.bulk_update(batch, ['grid_key', 'text_signature'])
+            updated += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f"Updated fingerprints for {updated} reports"))
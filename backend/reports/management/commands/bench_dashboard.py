@@ -0,0 +1,67 @@
+import asyncio
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+
+from reports.models import Report
+from reports.stats import (
+    run_sequentially, run_concurrently, dashboard_stats_queries,
+    dashboard_statistics_queries, statistics_queries
+)
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Compare sequential and concurrent latency of the dashboard aggregate queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--user', type=str, help='Username used for the per-user counts')
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        if iterations < 1:
+            raise CommandError('--iterations must be at least 1')
+
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"No user found with username: {options['user']}")
+        else:
+            user = User.objects.first()
+            if user is None:
+                raise CommandError('At least one user is required to run the benchmark')
+
+        queryset = Report.objects.all().select_related('reporter', 'category')
+        endpoints = {
+            'dashboard_stats': lambda: dashboard_stats_queries(queryset),
+            'dashboard_statistics': lambda: dashboard_statistics_queries(user),
+            'statistics': lambda: statistics_queries(queryset),
+        }
+
+        self.stdout.write(f"Reports in table: {Report.objects.count()}, iterations: {iterations}\n")
+        for name, build_queries in endpoints.items():
+            # Warm up connections on both paths before timing
+            run_sequentially(build_queries())
+            asyncio.run(run_concurrently(build_queries()))
+
+            sequential = self._time(lambda: run_sequentially(build_queries()), iterations)
+            concurrent = self._time(lambda: asyncio.run(run_concurrently(build_queries())), iterations)
+            speedup = sequential / concurrent if concurrent else float('inf')
+            self.stdout.write(
+                f"{name:<22} sequential {sequential * 1000:8.2f} ms  "
+                f"concurrent {concurrent * 1000:8.2f} ms  speedup {speedup:5.2f}x"
+            )
+
+    def _time(self, func, iterations):
+        """Median wall-clock time of ``func`` in seconds"""
+        samples = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            func()
+            samples.append(time.perf_counter() - start)
+        return statistics.median(samples)
@@ -0,0 +1,73 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from reports.fast_serializers import CommentRows, ReportRows
+from reports.models import Comment, Report
+from reports.renderers import FastJSONRenderer
+from reports.serializers import CommentSerializer, ReportSerializer
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Compare rows per second of the DRF serializers and the compiled values() path'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=500, help='Rows to serialize per run')
+        parser.add_argument('--iterations', type=int, default=5)
+
+    def handle(self, *args, **options):
+        limit = options['limit']
+        iterations = options['iterations']
+        if limit < 1 or iterations < 1:
+            raise CommandError('--limit and --iterations must be at least 1')
+
+        user = User.objects.first()
+        if user is None:
+            raise CommandError('At least one user is required to run the benchmark')
+        request = Request(APIRequestFactory().get('/api/reports/'))
+        request.user = user
+        context = {'request': request}
+
+        reports = Report.objects.select_related('reporter', 'category').prefetch_related(
+            'images', 'videos', 'comments__user', 'comments__helpful_votes'
+        ).order_by('-created_at')[:limit]
+        comments = Comment.objects.select_related('user').prefetch_related(
+            'helpful_votes', 'replies'
+        ).order_by('-created_at')[:limit]
+
+        cases = [
+            ('reports', Report.objects.order_by('-created_at')[:limit].count(),
+             lambda: JSONRenderer().render(ReportSerializer(reports.all(), many=True, context=context).data),
+             lambda: FastJSONRenderer().render(ReportRows(context=context).serialize(reports.all()))),
+            ('comments', Comment.objects.order_by('-created_at')[:limit].count(),
+             lambda: JSONRenderer().render(CommentSerializer(comments.all(), many=True, context=context).data),
+             lambda: FastJSONRenderer().render(CommentRows(context=context).serialize(comments.all()))),
+        ]
+
+        for name, rows, drf, compiled in cases:
+            if not rows:
+                self.stdout.write(f"{name:<10} no rows to serialize, skipped")
+                continue
+            drf_time = self._best(drf, iterations)
+            compiled_time = self._best(compiled, iterations)
+            self.stdout.write(
+                f"{name:<10} {rows} rows  "
+                f"drf {rows / drf_time:10.0f} rows/s  "
+                f"compiled {rows / compiled_time:10.0f} rows/s  "
+                f"speedup {drf_time / compiled_time:5.2f}x"
+            )
+
+    def _best(self, func, iterations):
+        """Fastest of ``iterations`` runs in seconds, queries included"""
+        best = float('inf')
+        for _ in range(iterations):
+            start = time.perf_counter()
+            func()
+            best = min(best, time.perf_counter() - start)
+        return best
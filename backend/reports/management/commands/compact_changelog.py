@@ -0,0 +1,25 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from reports.sync import backfill_changes, compact_changes
+
+
+class Command(BaseCommand):
+    help = 'Drop superseded delta-sync change log entries and expired tombstones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-days', type=int, default=None,
+                            help='Keep tombstones this long (default SYNC_TOMBSTONE_RETENTION_DAYS)')
+        parser.add_argument('--backfill', action='store_true',
+                            help='First log existing rows that have no entry, e.g. after upgrading')
+
+    def handle(self, *args, **options):
+        if options['backfill']:
+            added = backfill_changes()
+            self.stdout.write(f"Logged {added} existing rows")
+        days = options['retention_days']
+        superseded, tombstones = compact_changes(None if days is None else timedelta(days=days))
+        self.stdout.write(self.style.SUCCESS(
+            f"Removed {superseded} superseded entries and {tombstones} expired tombstones"
+        ))
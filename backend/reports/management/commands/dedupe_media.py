@@ -0,0 +1,101 @@
+import hashlib
+
+from django.core.management.base import BaseCommand
+
+from reports import blobs
+from reports.archive import index_archived_media
+from reports.models import ArchivedReport
+from reports.signals import MEDIA_FIELDS
+from reports.storage import blob_key, is_blob_name, media_storage
+from reports.sync import SYNC_KINDS, record_changes
+
+# Archived snapshot groups holding media rows, and their file field
+ARCHIVED_MEDIA = (('images', 'image'), ('videos', 'video'))
+
+
+class Command(BaseCommand):
+    help = 'Move existing report media into content-addressed storage so identical files are stored once'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only hash the files and report how much space deduplication would save')
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.blob_names = {}
+        self.missing = set()
+
+        rows = 0
+        for model, field in MEDIA_FIELDS.items():
+            legacy = (
+                model.objects.exclude(**{field: ''})
+                .exclude(**{f'{field}__startswith': 'cas/'})
+                .values_list('pk', field)
+            )
+            for pk, name in legacy.iterator():
+                blob = self._blob_for(name)
+                if blob is None:
+                    continue
+                rows += 1
+                if not self.dry_run:
+                    # Queryset update: the signal handlers would count the
+                    # reference again, so it is taken explicitly here.
+                    model.objects.filter(pk=pk).update(**{field: blob})
+                    blobs.acquire(blob)
+                    record_changes(SYNC_KINDS[model], [pk])
+
+        for entry in ArchivedReport.objects.iterator():
+            changed = False
+            for group, field in ARCHIVED_MEDIA:
+                for row in entry.data.get(group, []):
+                    name = row['fields'][field]
+                    if not name or is_blob_name(name):
+                        continue
+                    blob = self._blob_for(name)
+                    if blob is None:
+                        continue
+                    rows += 1
+                    if not self.dry_run:
+                        row['fields'][field] = blob
+                        blobs.acquire(blob)
+                        changed = True
+            if changed:
+                entry.save(update_fields=['data'])
+                index_archived_media([entry])
+
+        legacy_bytes = sum(size for size, _ in self.blob_names.values())
+        unique_bytes = sum({blob_key(blob): size for size, blob in self.blob_names.values()}.values())
+
+        if not self.dry_run:
+            # Every reference has moved to a blob, the originals can go
+            for name in self.blob_names:
+                media_storage.delete(name)
+
+        verb = 'Would move' if self.dry_run else 'Moved'
+        self.stdout.write(
+            f"{verb} {rows} media rows ({len(self.blob_names)} files, "
+            f"{len(set(blob_key(blob) for _, blob in self.blob_names.values()))} unique)"
+        )
+        self.stdout.write(f"Space: {legacy_bytes} bytes before, {unique_bytes} bytes after")
+        if self.missing:
+            self.stdout.write(self.style.WARNING(f"{len(self.missing)} referenced files are missing from storage"))
+
+    def _blob_for(self, name):
+        """Blob name for a legacy file, storing it on first sight; None if the file is missing"""
+        if name in self.blob_names:
+            return self.blob_names[name][1]
+        if name in self.missing or not media_storage.exists(name):
+            self.missing.add(name)
+            return None
+
+        size = media_storage.size(name)
+        with media_storage.open(name, 'rb') as legacy_file:
+            if self.dry_run:
+                digest = hashlib.sha256()
+                for chunk in legacy_file.chunks():
+                    digest.update(chunk)
+                blob = media_storage.blob_name(digest.hexdigest(), name)
+            else:
+                blob = media_storage.save(name, legacy_file)
+        self.blob_names[name] = (size, blob)
+        return blob
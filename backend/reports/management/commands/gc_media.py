@@ -0,0 +1,18 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from reports.blobs import collect_garbage
+
+
+class Command(BaseCommand):
+    help = 'Delete content-addressed media blobs that are no longer referenced by any report'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-seconds', type=int, default=None,
+                            help='Only delete blobs unreferenced for this long (default MEDIA_BLOB_GC_GRACE_SECONDS)')
+
+    def handle(self, *args, **options):
+        grace = options['grace_seconds']
+        deleted, freed = collect_garbage(None if grace is None else timedelta(seconds=grace))
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} blobs, freed {freed} bytes"))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from reports.archive import index_archived_media
+from reports.models import ArchivedReport
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the media name index of archived reports (needed for reports archived before it existed)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        indexed = 0
+        batch = []
+        for entry in ArchivedReport.objects.order_by('id').iterator(chunk_size=batch_size):
+            batch.append(entry)
+            if len(batch) >= batch_size:
+                indexed += index_archived_media(batch)
+                batch = []
+        if batch:
+            indexed += index_archived_media(batch)
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} archived media files"))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from reports.archive import restore_reports
+
+
+class Command(BaseCommand):
+    help = 'Move archived reports back into the active tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('ids', nargs='+', type=int)
+
+    def handle(self, *args, **options):
+        restored = restore_reports(options['ids'])
+        missing = sorted(set(options['ids']) - set(restored))
+        if missing:
+            self.stdout.write(self.style.WARNING(f"Not in the archive: {', '.join(map(str, missing))}"))
+        self.stdout.write(self.style.SUCCESS(f"Restored {len(restored)} reports"))
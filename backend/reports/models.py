@@ -1,8 +1,13 @@
-from django.db import models
+import datetime
+
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.utils.translation import gettext_lazy as _
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
+from django.core.serializers.json import DjangoJSONEncoder
+from .duplicates import grid_key, text_signature
+from .storage import get_media_storage
 
 class Category(models.Model):
     name = models.CharField(max_length=100)
@@ -19,6 +24,12 @@ class Category(models.Model):
         verbose_name_plural = "Categories"
         ordering = ['name']
 
+# Report statuses that still need staff work
+OPEN_STATUSES = ('pending', 'investigating', 'in_progress')
+
+# Report fields the duplicate detection fingerprint is computed from
+FINGERPRINT_FIELDS = ('title', 'description', 'latitude', 'longitude')
+
 class Report(models.Model):
     STATUS_CHOICES = [
         ('pending', _('Pending')),
@@ -43,6 +54,8 @@ class Report(models.Model):
         (5, _('Emergency')),
     ]
 
+    OPEN_STATUSES = OPEN_STATUSES
+
     title = models.CharField(max_length=200)
     description = models.TextField()
     location_name = models.CharField(max_length=200)
@@ -64,28 +77,190 @@ class Report(models.Model):
     views_count = models.PositiveIntegerField(default=0)
     estimated_cost = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     resolution_time_days = models.IntegerField(null=True, blank=True)
+    # Duplicate detection fingerprint, maintained by save()
+    grid_key = models.CharField(max_length=32, blank=True, editable=False)
+    text_signature = models.JSONField(default=list, blank=True, editable=False)
 
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the persisted status so save() can log transitions
+        if 'status' in field_names:
+            instance._loaded_status = instance.status
+        if set(FINGERPRINT_FIELDS) <= set(field_names):
+            instance._loaded_fingerprint_source = instance._fingerprint_source()
+        # The cached reporter category sets only change with these
+        if {'reporter_id', 'category_id'} <= set(field_names):
+            instance._loaded_reporter_category = (instance.reporter_id, instance.category_id)
+        return instance
+
+    def _fingerprint_source(self):
+        return tuple(getattr(self, name) for name in FINGERPRINT_FIELDS)
+
+    def _fingerprint_stale(self):
+        """Whether a full save() has to recompute the fingerprint"""
+        if self.get_deferred_fields() & {*FINGERPRINT_FIELDS, 'grid_key', 'text_signature'}:
+            # Only the loaded fields are written, so the fingerprint is not saved anyway
+            return False
+        return (
+            self._state.adding or not self.grid_key
+            or getattr(self, '_loaded_fingerprint_source', None) != self._fingerprint_source()
+        )
+
+    def refresh_fingerprint(self):
+        """Recompute the spatial grid key and text signature used to spot duplicates"""
+        self.grid_key = grid_key(self.latitude, self.longitude)
+        self.text_signature = text_signature(f"{self.title} {self.description}")
+
     def save(self, *args, **kwargs):
+        # MinHash over a long description is expensive: only recompute when
+        # the text or the coordinates changed.
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            if self._fingerprint_stale():
+                self.refresh_fingerprint()
+        elif set(update_fields) & set(FINGERPRINT_FIELDS):
+            self.refresh_fingerprint()
+            kwargs['update_fields'] = {*update_fields, 'grid_key', 'text_signature'}
         if self.status == 'resolved' and not self.resolved_at:
             self.resolved_at = timezone.now()
             if self.created_at:
                 time_diff = self.resolved_at - self.created_at
                 self.resolution_time_days = time_diff.days
-        super().save(*args, **kwargs)
+        if self._state.adding:
+            previous_status = None
+        else:
+            # Without a loaded status (e.g. deferred) assume it is unchanged
+            previous_status = getattr(self, '_loaded_status', self.status)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if self.status != previous_status:
+                StatusTransition.record(self, previous_status)
+        self._loaded_status = self.status
+        deferred = self.get_deferred_fields()
+        if not deferred & set(FINGERPRINT_FIELDS):
+            self._loaded_fingerprint_source = self._fingerprint_source()
+        if not deferred & {'reporter_id', 'category_id'}:
+            self._loaded_reporter_category = (self.reporter_id, self.category_id)
 
     class Meta:
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['status', 'created_at']),
             models.Index(fields=['severity', 'priority']),
+            models.Index(fields=['grid_key', 'created_at']),
+            # Triage queues: each partial index matches its queue predicate
+            # and sort order so pages are read straight off the index.
+            models.Index(
+                fields=['-priority', 'created_at', 'id'],
+                condition=models.Q(assigned_to__isnull=True, status__in=OPEN_STATUSES),
+                name='report_triage_unassigned_idx',
+            ),
+            models.Index(
+                fields=['assigned_to', '-priority', 'created_at', 'id'],
+                condition=models.Q(status__in=OPEN_STATUSES),
+                name='report_triage_mine_idx',
+            ),
+            models.Index(
+                fields=['created_at', 'id'],
+                condition=models.Q(status__in=OPEN_STATUSES),
+                name='report_triage_overdue_idx',
+            ),
+        ]
+
+class StatusTransition(models.Model):
+    """
+    Append-only log of report status changes, written by ``Report.save``.
+
+    Rows stay in this table when their report is archived: ``report`` is
+    cleared and ``archived_report`` set instead, so SLA analytics still cover
+    archived reports.
+    """
+    report = models.ForeignKey(
+        Report, related_name='status_transitions', on_delete=models.CASCADE, null=True, blank=True
+    )
+    archived_report = models.ForeignKey(
+        'ArchivedReport', related_name='status_transitions', on_delete=models.CASCADE, null=True, blank=True
+    )
+    from_status = models.CharField(max_length=20, choices=Report.STATUS_CHOICES, blank=True)
+    to_status = models.CharField(max_length=20, choices=Report.STATUS_CHOICES)
+    changed_at = models.DateTimeField(default=timezone.now)
+    seconds_in_from_status = models.PositiveIntegerField(
+        null=True, blank=True, help_text="Time spent in from_status before this transition"
+    )
+    seconds_since_created = models.PositiveIntegerField(
+        null=True, blank=True, help_text="Report age at the time of this transition"
+    )
+
+    def __str__(self):
+        return f"{self.report_id}: {self.from_status or '-'} -> {self.to_status}"
+
+    @classmethod
+    def build(cls, report_id, created_at, from_status, to_status, changed_at, previous_changed_at=None):
+        """Unsaved transition row, for callers that insert in bulk"""
+        return cls(
+            report_id=report_id,
+            from_status=from_status or '',
+            to_status=to_status,
+            changed_at=changed_at,
+            seconds_in_from_status=(
+                _elapsed_seconds(previous_changed_at or created_at, changed_at) if from_status else None
+            ),
+            seconds_since_created=_elapsed_seconds(created_at, changed_at),
+        )
+
+    @classmethod
+    def record(cls, report, from_status, changed_at=None):
+        """Append a transition for ``report`` moving out of ``from_status``"""
+        previous_changed_at = None
+        if from_status:
+            previous_changed_at = cls.objects.filter(report=report).order_by(
+                '-changed_at'
+            ).values_list('changed_at', flat=True).first()
+        transition = cls.build(
+            report.pk, report.created_at, from_status, report.status,
+            changed_at or timezone.now(), previous_changed_at
+        )
+        transition.save()
+        return transition
+
+    class Meta:
+        ordering = ['changed_at']
+        indexes = [
+            models.Index(fields=['to_status', 'changed_at']),
+            models.Index(fields=['from_status', 'changed_at']),
+            models.Index(fields=['report', 'changed_at']),
+            models.Index(fields=['archived_report', 'changed_at']),
+        ]
+
+def _elapsed_seconds(start, end):
+    if not start:
+        return None
+    return max(int((end - start).total_seconds()), 0)
+
+class MediaBlob(models.Model):
+    """A content-addressed media file shared by every media row with the same bytes"""
+    name = models.CharField(max_length=255, unique=True, help_text="Storage path of the blob")
+    digest = models.CharField(max_length=64, db_index=True, help_text="sha256 of the content")
+    size = models.BigIntegerField(null=True, blank=True, help_text="File size in bytes")
+    ref_count = models.IntegerField(default=0)
+    orphaned_at = models.DateTimeField(null=True, blank=True, help_text="When the last reference was dropped")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} refs)"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['orphaned_at'], condition=models.Q(ref_count__lte=0), name='mediablob_orphaned_idx'),
         ]
 
 class ReportImage(models.Model):
     report = models.ForeignKey(Report, related_name='images', on_delete=models.CASCADE)
-    image = models.ImageField(upload_to='reports/%Y/%m/%d/')
+    image = models.ImageField(upload_to='reports/%Y/%m/%d/', storage=get_media_storage, db_index=True)
     caption = models.CharField(max_length=200, blank=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
     is_primary = models.BooleanField(default=False)
@@ -105,7 +280,7 @@ class ReportImage(models.Model):
 
 class ReportVideo(models.Model):
     report = models.ForeignKey(Report, related_name='videos', on_delete=models.CASCADE)
-    video = models.FileField(upload_to='reports/videos/%Y/%m/%d/')
+    video = models.FileField(upload_to='reports/videos/%Y/%m/%d/', storage=get_media_storage, db_index=True)
     caption = models.CharField(max_length=200, blank=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
     size = models.PositiveIntegerField(help_text="File size in bytes", null=True)
@@ -159,4 +334,87 @@ class ReportSubscription(models.Model):
         ordering = ['-created_at']
 
     def __str__(self):
-        return f"{self.user.username}'s subscription to {self.report.title}"
\ No newline at end of file
+        return f"{self.user.username}'s subscription to {self.report.title}"
+
+class PreciseJSONEncoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder that keeps full microsecond precision on datetimes (archives, cursors)"""
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+class ArchivedReport(models.Model):
+    """
+    Cold storage for closed reports moved out of the ``Report`` table.
+
+    The columns mirror what listing, search and SLA analytics need; ``data``
+    holds the serialized report together with its comments, images, videos
+    and subscriptions so it can be restored exactly. Status transitions stay
+    in ``StatusTransition``.
+    The primary key is the original report id.
+    """
+    CLOSED_STATUSES = ('resolved', 'rejected')
+
+    id = models.BigIntegerField(primary_key=True)
+    title = models.CharField(max_length=200)
+    description = models.TextField()
+    location_name = models.CharField(max_length=200)
+    category = models.ForeignKey(Category, related_name='+', on_delete=models.SET_NULL, null=True)
+    reporter = models.ForeignKey(User, related_name='+', on_delete=models.CASCADE)
+    status = models.CharField(max_length=20, choices=Report.STATUS_CHOICES)
+    severity = models.CharField(max_length=20, choices=Report.SEVERITY_CHOICES)
+    priority = models.IntegerField(choices=Report.PRIORITY_CHOICES, default=2)
+    assigned_to = models.ForeignKey(User, related_name='+', null=True, blank=True, on_delete=models.SET_NULL)
+    is_public = models.BooleanField(default=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
+    data = models.JSONField(encoder=PreciseJSONEncoder)
+
+    def __str__(self):
+        return f"{self.title} (archived)"
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at']),
+        ]
+
+class ArchivedMedia(models.Model):
+    """Stored media file name of an archived report, so media requests can find its owner by index"""
+    archived_report = models.ForeignKey(ArchivedReport, related_name='media', on_delete=models.CASCADE)
+    name = models.CharField(max_length=255, db_index=True)
+
+    def __str__(self):
+        return self.name
+
+class ChangeLog(models.Model):
+    """
+    Change feed behind the delta-sync endpoint.
+
+    Every create, update and delete of a synced row appends an entry; the
+    auto-incrementing id is the sync sequence, so "what changed since token
+    N" is a primary key range scan. Deletes are recorded as tombstones.
+    """
+    KIND_CHOICES = (
+        ('report', 'Report'),
+        ('comment', 'Comment'),
+        ('category', 'Category'),
+        ('image', 'Report image'),
+        ('video', 'Report video'),
+    )
+
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    deleted = models.BooleanField(default=False)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id} {'deleted' if self.deleted else 'changed'}"
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['kind', 'object_id', 'id']),
+            models.Index(fields=['changed_at'], name='changelog_tombstone_idx', condition=models.Q(deleted=True)),
+        ]
@@ -0,0 +1,103 @@
+import base64
+import json
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from .models import PreciseJSONEncoder
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (seek) pagination over the queryset's own ``order_by``.
+
+    The cursor holds the sort key of the last row on the page, at full
+    precision so the seek never matches that row again, and the next page is
+    fetched with a ``WHERE (sort key) > cursor`` predicate, so every page
+    costs one index range scan regardless of depth. The ordering must be made
+    of concrete model fields and end in a unique one (usually ``id``).
+    DRF's ``CursorPagination`` only seeks on the first ordering field and falls
+    back to offsets for ties, which degrades badly on low-cardinality keys
+    such as ``priority``.
+    """
+    page_size = 25
+    max_page_size = 100
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = [
+            (name.lstrip('-'), name.startswith('-'))
+            for name in queryset.query.order_by
+        ]
+        assert self.ordering, 'KeysetPagination requires an ordered queryset'
+        self.fields = [queryset.model._meta.get_field(name) for name, _ in self.ordering]
+
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            queryset = queryset.filter(self._after(cursor))
+
+        page_size = self.get_page_size(request)
+        rows = list(queryset[:page_size + 1])
+        self.has_next = len(rows) > page_size
+        self.page = rows[:page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def _after(self, cursor):
+        """Rows sorting strictly after ``cursor`` in the queryset ordering"""
+        condition = Q()
+        for position, ((name, descending), value) in enumerate(zip(self.ordering, cursor)):
+            lookup = {f"{name}__{'lt' if descending else 'gt'}": value}
+            for (prefix_name, _), prefix_value in zip(self.ordering[:position], cursor):
+                lookup[prefix_name] = prefix_value
+            condition |= Q(**lookup)
+        return condition
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            values = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            if len(values) != len(self.fields):
+                raise ValueError
+            return [field.to_python(value) for field, value in zip(self.fields, values)]
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, row):
+        values = [getattr(row, field.attname) for field in self.fields]
+        return base64.urlsafe_b64encode(
+            json.dumps(values, cls=PreciseJSONEncoder).encode('ascii')
+        ).decode('ascii')
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+
+class ArchivedReportPagination(KeysetPagination):
+    """Pages the archived reports appended to a report list by ``?include_archived=true``"""
+    page_size = 50
+    cursor_query_param = 'archived_cursor'
+    page_size_query_param = 'archived_page_size'
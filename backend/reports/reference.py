@@ -0,0 +1,149 @@
+"""
+Process-local cache of categories and other reference data.
+
+Categories are read by most requests and almost never written. Each process
+keeps a snapshot of them tagged with a version stored in the shared Django
+cache; saving or deleting a category replaces the version once the
+transaction commits, and every process reloads its snapshot when it notices
+the change. The shared version is checked at most every
+``REFERENCE_CACHE_CHECK_SECONDS``, and no snapshot is used for longer than
+``REFERENCE_CACHE_MAX_AGE`` even if the version was lost. A category id that
+is missing from the snapshot is looked up in the database and triggers a
+reload, so a category created by another process is usable right away.
+
+The categories each reporter has used are kept in the shared cache as well,
+so listing them does not join and de-duplicate over ``Report``.
+"""
+import copy
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Category, Report
+
+CATEGORY_VERSION_KEY = 'reference:categories:version'
+REPORTER_CATEGORIES_KEY = 'reference:reporter-categories:{}'
+
+
+class _Snapshot:
+
+    def __init__(self, version, categories):
+        self.version = version
+        self.categories = categories
+        self.by_id = {category.pk: category for category in categories}
+        self.loaded_at = self.checked_at = time.monotonic()
+
+
+_snapshot = None
+_lock = threading.Lock()
+
+
+def _shared_version():
+    version = cache.get(CATEGORY_VERSION_KEY)
+    if version is None:
+        cache.add(CATEGORY_VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(CATEGORY_VERSION_KEY)
+    return version
+
+
+def _current(reload=False):
+    global _snapshot
+    snapshot = _snapshot
+    interval = getattr(settings, 'REFERENCE_CACHE_CHECK_SECONDS', 5)
+    if not reload and snapshot is not None and time.monotonic() - snapshot.checked_at < interval:
+        return snapshot
+
+    with _lock:
+        version = _shared_version()
+        now = time.monotonic()
+        max_age = getattr(settings, 'REFERENCE_CACHE_MAX_AGE', 300)
+        snapshot = _snapshot
+        if (
+            not reload and snapshot is not None and snapshot.version == version
+            and now - snapshot.loaded_at < max_age
+        ):
+            snapshot.checked_at = now
+        else:
+            _snapshot = snapshot = _Snapshot(version, list(Category.objects.all()))
+        return snapshot
+
+
+def _covering(ids):
+    """The current snapshot, reloaded once if it lacks any of ``ids``"""
+    snapshot = _current()
+    if not set(ids) <= snapshot.by_id.keys():
+        snapshot = _current(reload=True)
+    return snapshot
+
+
+def categories(include=()):
+    """All categories in their default (name) order. Treat them as read-only.
+
+    Reloads first when a category id in ``include`` is not cached yet.
+    """
+    return _covering(include).categories
+
+
+def get_category(pk):
+    """A private copy of the category with primary key ``pk``, or None"""
+    category = _current().by_id.get(pk)
+    if category is None:
+        # Possibly created by another process since the snapshot was taken
+        if not Category.objects.filter(pk=pk).exists():
+            return None
+        category = _current(reload=True).by_id.get(pk)
+    return copy.copy(category) if category is not None else None
+
+
+def category_names(include=()):
+    """Mapping of category id to name, covering the ids in ``include``"""
+    return {pk: category.name for pk, category in _covering(include).by_id.items()}
+
+
+def invalidate_categories():
+    """Make every process reload categories after the current transaction commits"""
+    def bump():
+        global _snapshot
+        cache.set(CATEGORY_VERSION_KEY, uuid.uuid4().hex, None)
+        _snapshot = None
+    transaction.on_commit(bump)
+
+
+def reporter_category_ids(user_id):
+    """Ids of the categories used by ``user_id``'s reports"""
+    key = REPORTER_CATEGORIES_KEY.format(user_id)
+    ids = cache.get(key)
+    if ids is None:
+        ids = set(
+            Report.objects.filter(reporter_id=user_id, category__isnull=False)
+            .values_list('category_id', flat=True).distinct()
+        )
+        cache.set(key, ids, getattr(settings, 'REFERENCE_CACHE_TIMEOUT', 300))
+    return ids
+
+
+def reporter_categories(user_id):
+    """Categories used by ``user_id``'s reports, in category order"""
+    used = reporter_category_ids(user_id)
+    return [category for category in categories(include=used) if category.pk in used]
+
+
+def forget_reporter_categories(user_id):
+    """Drop the cached category set of ``user_id`` once the current transaction commits"""
+    transaction.on_commit(lambda: cache.delete(REPORTER_CATEGORIES_KEY.format(user_id)))
+
+
+def choices():
+    """Report status, severity and priority choices with translated labels"""
+    return {
+        name: [{'value': value, 'label': str(label)} for value, label in options]
+        for name, options in (
+            ('statuses', Report.STATUS_CHOICES),
+            ('severities', Report.SEVERITY_CHOICES),
+            ('priorities', Report.PRIORITY_CHOICES),
+        )
+    }
@@ -1,6 +1,65 @@
 from rest_framework import serializers
 from .models import Report, Category, ReportImage, ReportVideo, Comment
 from django.contrib.auth.models import User
+from . import reference
+
+def parse_field_list(value):
+    """Split a comma separated ``?fields=``/``?expand=`` value into a set"""
+    if value is None:
+        return None
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+def relation_requested(name, fields=None, expand=None):
+    """Whether nested relation ``name`` is wanted for the given selection.
+
+    With neither ``fields`` nor ``expand`` everything is serialized as before.
+    Otherwise nested relations are opt-in: listed in ``expand`` or ``fields``.
+    """
+    if fields is None and expand is None:
+        return True
+    return name in (expand or ()) or name in (fields or ())
+
+class SparseFieldsMixin:
+    """
+    Serializer mixin adding sparse fieldsets and opt-in expansion.
+
+    ``fields`` limits the output to the named fields. ``expand`` names the
+    nested relations (from ``expandable_fields``) to include; once either is
+    given, relations that were not asked for are dropped so they are neither
+    serialized nor need to be queried. Write-only fields are always kept.
+    """
+    expandable_fields = ()
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.requested_fields = fields
+        self.requested_expand = expand
+        if fields is None and expand is None:
+            return
+        for name in list(self.fields):
+            if self.fields[name].write_only:
+                continue
+            if name in self.expandable_fields:
+                keep = relation_requested(name, fields, expand)
+            else:
+                keep = fields is None or name in fields
+            if not keep:
+                self.fields.pop(name)
+
+class CachedCategoryField(serializers.PrimaryKeyRelatedField):
+    """Category primary key validated against the process-local reference cache"""
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        category = reference.get_category(pk)
+        if category is None:
+            self.fail('does_not_exist', pk_value=data)
+        return category
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -22,7 +81,8 @@ class ReportVideoSerializer(serializers.ModelSerializer):
         model = ReportVideo
         fields = ('id', 'video', 'caption', 'uploaded_at', 'size', 'duration')
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = ('user', 'replies')
     user = UserSerializer(read_only=True)
     helpful_count = serializers.SerializerMethodField()
     has_voted = serializers.SerializerMethodField()
@@ -67,13 +127,17 @@ class CommentSerializer(serializers.ModelSerializer):
 
     def get_replies(self, obj):
         # Only get direct replies, not nested ones
-        replies = obj.replies.filter(parent=obj)
-        return CommentSerializer(replies, many=True, context=self.context).data
+        replies = obj.replies.all()
+        return CommentSerializer(
+            replies, many=True, context=self.context,
+            fields=self.requested_fields, expand=self.requested_expand
+        ).data
 
-class ReportSerializer(serializers.ModelSerializer):
+class ReportSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = ('reporter', 'category', 'images', 'videos', 'comments')
     reporter = UserSerializer(read_only=True)
     category = CategorySerializer(read_only=True)
-    category_id = serializers.PrimaryKeyRelatedField(
+    category_id = CachedCategoryField(
         queryset=Category.objects.all(),
         write_only=True,
         source='category',
@@ -91,4 +155,69 @@ class ReportSerializer(serializers.ModelSerializer):
             'category', 'category_id', 'reporter', 'status', 'severity',
             'created_at', 'updated_at', 'verified', 'images', 'videos', 'comments'
         )
-        read_only_fields = ('reporter', 'verified', 'created_at', 'updated_at')
\ No newline at end of file
+        read_only_fields = ('reporter', 'verified', 'created_at', 'updated_at')
+
+class TriageReportSerializer(serializers.ModelSerializer):
+    """Compact report representation for the staff triage queues"""
+    category = CategorySerializer(read_only=True)
+    assigned_to = UserSerializer(read_only=True)
+
+    class Meta:
+        model = Report
+        fields = (
+            'id', 'title', 'location_name', 'latitude', 'longitude', 'category',
+            'status', 'severity', 'priority', 'assigned_to', 'created_at', 'updated_at'
+        )
+        read_only_fields = fields
+
+
+class BulkReportFilterSerializer(serializers.Serializer):
+    status = serializers.ChoiceField(choices=Report.STATUS_CHOICES, required=False)
+    severity = serializers.ChoiceField(choices=Report.SEVERITY_CHOICES, required=False)
+    priority = serializers.ChoiceField(choices=Report.PRIORITY_CHOICES, required=False)
+    category = serializers.IntegerField(required=False)
+    assigned_to = serializers.IntegerField(required=False, allow_null=True)
+    created_before = serializers.DateTimeField(required=False)
+    created_after = serializers.DateTimeField(required=False)
+
+    @staticmethod
+    def to_lookups(data):
+        """ORM filter keyword arguments for validated filter data"""
+        lookups = {
+            field: data[field]
+            for field in ('status', 'severity', 'priority')
+            if field in data
+        }
+        if 'category' in data:
+            lookups['category_id'] = data['category']
+        if 'assigned_to' in data:
+            if data['assigned_to'] is None:
+                lookups['assigned_to__isnull'] = True
+            else:
+                lookups['assigned_to_id'] = data['assigned_to']
+        if 'created_before' in data:
+            lookups['created_at__lt'] = data['created_before']
+        if 'created_after' in data:
+            lookups['created_at__gte'] = data['created_after']
+        return lookups
+
+class BulkReportUpdateSerializer(serializers.Serializer):
+    """Target reports (``ids`` or ``filter``) and the changes to apply to them"""
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False)
+    filter = BulkReportFilterSerializer(required=False)
+    status = serializers.ChoiceField(choices=Report.STATUS_CHOICES, required=False)
+    assigned_to = serializers.PrimaryKeyRelatedField(
+        queryset=User.objects.filter(is_staff=True), required=False, allow_null=True
+    )
+    priority = serializers.ChoiceField(choices=Report.PRIORITY_CHOICES, required=False)
+    verified = serializers.BooleanField(required=False)
+    verification_notes = serializers.CharField(required=False, allow_blank=True)
+
+    def validate(self, attrs):
+        if ('ids' in attrs) == ('filter' in attrs):
+            raise serializers.ValidationError("Provide exactly one of 'ids' or 'filter'")
+        if 'filter' in attrs and not attrs['filter']:
+            raise serializers.ValidationError("'filter' needs at least one condition")
+        if not any(field in attrs for field in ('status', 'assigned_to', 'priority', 'verified', 'verification_notes')):
+            raise serializers.ValidationError("No changes given")
+        return attrs
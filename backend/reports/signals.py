@@ -0,0 +1,108 @@
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save
+
+from . import blobs, reference
+from .archive import archived_media_names
+from .models import ArchivedReport, Category, Comment, Report, ReportImage, ReportVideo
+from .sync import SYNC_KINDS, record_changes
+
+# Media models whose file field points at a content-addressed blob
+MEDIA_FIELDS = {
+    ReportImage: 'image',
+    ReportVideo: 'video',
+}
+
+
+def remember_media_name(sender, instance, **kwargs):
+    """Keep the stored file name so post_save can tell when it changes"""
+    value = instance.__dict__.get(MEDIA_FIELDS[sender])
+    instance._stored_media_name = value if isinstance(value, str) else None
+
+
+def count_media_reference(sender, instance, created, **kwargs):
+    media = getattr(instance, MEDIA_FIELDS[sender])
+    name = media.name
+    previous = None if created else getattr(instance, '_stored_media_name', None)
+    if name != previous:
+        blobs.acquire(name, content=media)
+        blobs.release(previous)
+    instance._stored_media_name = name
+
+
+def drop_media_reference(sender, instance, **kwargs):
+    blobs.release(getattr(instance, MEDIA_FIELDS[sender]).name)
+
+
+def drop_archived_media_references(sender, instance, **kwargs):
+    """Release the references ``archive_reports`` took for the archived media"""
+    for name in archived_media_names(instance):
+        blobs.release(name)
+
+
+for model in MEDIA_FIELDS:
+    post_init.connect(remember_media_name, sender=model, dispatch_uid=f'remember_media_name_{model.__name__}')
+    post_save.connect(count_media_reference, sender=model, dispatch_uid=f'count_media_reference_{model.__name__}')
+    post_delete.connect(drop_media_reference, sender=model, dispatch_uid=f'drop_media_reference_{model.__name__}')
+post_delete.connect(
+    drop_archived_media_references, sender=ArchivedReport, dispatch_uid='drop_archived_media_references'
+)
+
+
+def log_saved(sender, instance, created, **kwargs):
+    record_changes(SYNC_KINDS[sender], [instance.pk])
+
+
+def log_deleted(sender, instance, **kwargs):
+    record_changes(SYNC_KINDS[sender], [instance.pk], deleted=True)
+
+
+def log_primary_image(sender, instance, **kwargs):
+    """``ReportImage.save`` clears ``is_primary`` on the sibling images with a queryset update"""
+    if instance.is_primary and not kwargs.get('raw'):
+        record_changes('image', ReportImage.objects.filter(report_id=instance.report_id).exclude(
+            pk=instance.pk
+        ).values_list('id', flat=True))
+
+
+def log_helpful_votes(sender, instance, action, reverse, pk_set, **kwargs):
+    """Votes change a comment's ``helpful_count``"""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        record_changes('comment', [instance.pk])
+    elif pk_set:
+        record_changes('comment', pk_set)
+
+
+for model in SYNC_KINDS:
+    post_save.connect(log_saved, sender=model, dispatch_uid=f'sync_log_saved_{model.__name__}')
+    post_delete.connect(log_deleted, sender=model, dispatch_uid=f'sync_log_deleted_{model.__name__}')
+post_save.connect(log_primary_image, sender=ReportImage, dispatch_uid='sync_log_primary_image')
+m2m_changed.connect(log_helpful_votes, sender=Comment.helpful_votes.through, dispatch_uid='sync_log_helpful_votes')
+
+
+def reload_categories(sender, **kwargs):
+    reference.invalidate_categories()
+
+
+def forget_reporter_categories(sender, instance, **kwargs):
+    reference.forget_reporter_categories(instance.reporter_id)
+
+
+def forget_changed_reporter_categories(sender, instance, created, update_fields=None, **kwargs):
+    """Only new reports and changes of reporter or category affect the cached sets"""
+    if update_fields is not None and not {'reporter', 'reporter_id', 'category', 'category_id'} & update_fields:
+        return
+    loaded = None if created else getattr(instance, '_loaded_reporter_category', None)
+    current = (instance.reporter_id, instance.category_id)
+    if loaded == current:
+        return
+    for user_id in {current[0], loaded[0] if loaded else None} - {None}:
+        reference.forget_reporter_categories(user_id)
+
+
+post_save.connect(reload_categories, sender=Category, dispatch_uid='reference_reload_categories_saved')
+post_delete.connect(reload_categories, sender=Category, dispatch_uid='reference_reload_categories_deleted')
+post_save.connect(
+    forget_changed_reporter_categories, sender=Report, dispatch_uid='reference_forget_reporter_categories_saved'
+)
+post_delete.connect(forget_reporter_categories, sender=Report, dispatch_uid='reference_forget_reporter_categories_deleted')
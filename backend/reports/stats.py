@@ -0,0 +1,137 @@
+"""
+Aggregate queries behind the dashboard endpoints.
+
+Each ``*_queries`` function returns a mapping of response key to a zero
+argument callable. The queries are independent of each other, so the sync
+views evaluate them one after another while the async views in
+``views_async`` run them concurrently.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count
+from django.utils import timezone
+
+from . import reference
+from .models import Report
+from .fast_serializers import ReportRows
+
+# Each worker thread keeps its own database connection open between requests,
+# so the pool size also caps how many connections the dashboard holds.
+_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'DASHBOARD_QUERY_WORKERS', 5),
+    thread_name_prefix='dashboard-query',
+)
+_worker = threading.local()
+
+
+def dashboard_stats_queries(queryset):
+    """Queries for ``ReportViewSet.dashboard_stats``"""
+    return {
+        'totalReports': queryset.count,
+        'resolvedReports': queryset.filter(status='resolved').count,
+        'pendingReports': queryset.filter(status='pending').count,
+        'recentReports': lambda: ReportRows().serialize(queryset.order_by('-created_at')[:5]),
+    }
+
+
+def dashboard_statistics_queries(user):
+    """Queries for ``ReportViewSet.dashboard_statistics``"""
+    thirty_days_ago = timezone.now() - timedelta(days=30)
+    return {
+        'total_reports': Report.objects.count,
+        'recent_reports': Report.objects.filter(created_at__gte=thirty_days_ago).count,
+        'reports_by_category': lambda: _reports_by_category(Report.objects.all()),
+        'reports_by_severity': lambda: list(
+            Report.objects.values('severity').annotate(count=Count('id'))
+        ),
+        'user_reports': Report.objects.filter(reporter=user).count,
+    }
+
+
+def _reports_by_category(queryset):
+    """Report count of every category, including empty ones, in category order.
+
+    Groups on the report table alone and takes the names from the category cache.
+    """
+    counts = dict(queryset.values_list('category_id').annotate(count=Count('id')).order_by())
+    return [
+        {'name': category.name, 'report_count': counts.get(category.pk, 0)}
+        for category in reference.categories(include=counts.keys() - {None})
+    ]
+
+
+def _counts_by_category_name(queryset):
+    counts = list(queryset.values_list('category_id').annotate(count=Count('id')).order_by())
+    names = reference.category_names(include={category_id for category_id, _ in counts} - {None})
+    return [
+        {'category__name': names.get(category_id), 'count': count}
+        for category_id, count in counts
+    ]
+
+
+def statistics_queries(queryset):
+    """Queries for ``ReportViewSet.statistics``"""
+    seven_days_ago = timezone.now() - timedelta(days=7)
+    return {
+        'total_reports': queryset.count,
+        'pending_reports': queryset.filter(status='pending').count,
+        'resolved_reports': queryset.filter(status='resolved').count,
+        'recent_reports': queryset.filter(created_at__gte=seven_days_ago).count,
+        'by_category': lambda: _counts_by_category_name(queryset),
+        'by_severity': lambda: list(queryset.values('severity').annotate(count=Count('id'))),
+    }
+
+
+def run_sequentially(queries):
+    """Evaluate the queries one after another in the calling thread"""
+    return {key: query() for key, query in queries.items()}
+
+
+def _run_in_worker(query):
+    # Worker threads live outside the request cycle, so nothing closes their
+    # connections for them. They are kept open across queries independently of
+    # CONN_MAX_AGE (which is 0 here and would mean one connect per query) and
+    # replaced after DASHBOARD_CONNECTION_MAX_AGE seconds or once broken.
+    if connection.connection is not None:
+        expired = time.monotonic() >= getattr(_worker, 'connection_expires', 0)
+        if expired or (connection.errors_occurred and not connection.is_usable()):
+            connection.close()
+        connection.errors_occurred = False
+    if connection.connection is None:
+        _worker.connection_expires = time.monotonic() + getattr(settings, 'DASHBOARD_CONNECTION_MAX_AGE', 300)
+    return query()
+
+
+def _close_connection(barrier):
+    barrier.wait()
+    connection.close()
+
+
+def close_worker_connections():
+    """Close the database connection of every pool thread (e.g. at shutdown)"""
+    workers = _executor._max_workers
+    barrier = threading.Barrier(workers)
+    # The barrier holds each task until all are running, one per thread
+    for future in [_executor.submit(_close_connection, barrier) for _ in range(workers)]:
+        future.result()
+
+
+async def run_concurrently(queries):
+    """Evaluate the queries concurrently on the bounded worker pool.
+
+    Django's async ORM methods (``acount`` and friends) all hop onto the single
+    thread-sensitive executor and therefore still run one at a time, so each
+    query gets a pool thread (and with it a database connection) of its own.
+    """
+    loop = asyncio.get_running_loop()
+    results = await asyncio.gather(*(
+        loop.run_in_executor(_executor, _run_in_worker, query)
+        for query in queries.values()
+    ))
+    return dict(zip(queries.keys(), results))
@@ -0,0 +1,86 @@
+"""
+Content-addressed storage for report media.
+
+Uploads are hashed while they are streamed to disk and stored once under
+``cas/<aa>/<bb>/<sha256>``. Media rows refer to a blob as
+``cas/<aa>/<bb>/<sha256><ext>``: the extension only keeps the upload's type
+for content negotiation, so identical bytes uploaded as ``.jpg`` and ``.png``
+share one file. Saving identical bytes again (a re-post of the same photo, a
+retried upload) reuses the existing file, and every media row that points at
+a blob is counted in ``MediaBlob.ref_count`` so unreferenced blobs can be
+garbage collected (see ``reports.blobs``).
+"""
+import hashlib
+import os
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+BLOB_PREFIX = 'cas/'
+
+
+def is_blob_name(name):
+    return bool(name) and name.startswith(BLOB_PREFIX)
+
+
+def blob_digest(name):
+    """sha256 hex digest encoded in a blob name"""
+    return os.path.splitext(os.path.basename(name))[0]
+
+
+def blob_key(name):
+    """Storage name of the file behind a blob reference, without the upload's extension"""
+    return os.path.splitext(name)[0] if is_blob_name(name) else name
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+
+    def blob_name(self, digest, original_name):
+        extension = os.path.splitext(original_name)[1].lower()
+        return f"{BLOB_PREFIX}{digest[:2]}/{digest[2:4]}/{digest}{extension}"
+
+    def path(self, name):
+        return super().path(blob_key(name))
+
+    def get_available_name(self, name, max_length=None):
+        # The final name is only known once the content is hashed in _save()
+        return name
+
+    def _save(self, name, content):
+        temp_dir = self.path(f"{BLOB_PREFIX}tmp")
+        os.makedirs(temp_dir, exist_ok=True)
+
+        digest = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(dir=temp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temp_file.write(chunk)
+
+            blob = self.blob_name(digest.hexdigest(), name)
+            full_path = self.path(blob)
+            if os.path.exists(full_path):
+                # Already stored: refresh the mtime so a concurrent garbage
+                # collection pass treats the blob as recently used.
+                os.utime(full_path)
+            else:
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                if self.file_permissions_mode is not None:
+                    os.chmod(temp_path, self.file_permissions_mode)
+                os.replace(temp_path, full_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return blob
+
+
+media_storage = ContentAddressedStorage()
+
+
+def get_media_storage():
+    return media_storage
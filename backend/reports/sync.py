@@ -0,0 +1,223 @@
+"""
+Delta sync for offline clients.
+
+Signal handlers (and the few queryset updates that bypass signals) append
+``ChangeLog`` entries for reports, comments, categories and media rows.
+``sync_page`` reads the entries after a client's token, keeps the latest
+entry per object and loads only those objects, so the cost of a sync is
+proportional to what changed rather than to the size of the dataset.
+
+Entries are written when the surrounding transaction commits, so the log
+sequence follows commit order; entries younger than ``SYNC_SETTLE_SECONDS``
+are held back to cover sequence values taken by concurrent commits that are
+not visible yet. A token records when it was issued: tombstones are pruned
+after ``SYNC_TOMBSTONE_RETENTION_DAYS``, and older tokens must resync from
+scratch.
+"""
+import base64
+import json
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .fast_serializers import CommentRows, ReportRows
+from .models import Category, ChangeLog, Comment, Report, ReportImage, ReportVideo
+from .serializers import CategorySerializer, ReportImageSerializer, ReportVideoSerializer
+
+SYNC_KINDS = {
+    Report: 'report',
+    Comment: 'comment',
+    Category: 'category',
+    ReportImage: 'image',
+    ReportVideo: 'video',
+}
+
+# Response key for each kind, in output order
+SYNC_SECTIONS = {
+    'category': 'categories',
+    'report': 'reports',
+    'comment': 'comments',
+    'image': 'images',
+    'video': 'videos',
+}
+
+# Nested relations are synced as their own kinds; related rows are sent as
+# ids so that changing one does not resend everything that references it
+REPORT_SYNC_FIELDS = {
+    'id', 'title', 'description', 'location_name', 'latitude', 'longitude',
+    'status', 'severity', 'created_at', 'updated_at', 'verified'
+}
+COMMENT_SYNC_FIELDS = {
+    'id', 'content', 'created_at', 'updated_at', 'is_staff_response',
+    'helpful_count', 'has_voted', 'can_edit', 'can_delete', 'parent', 'edited', 'is_hidden'
+}
+
+
+class InvalidSyncToken(ValueError):
+    pass
+
+
+class ExpiredSyncToken(Exception):
+    pass
+
+
+def record_changes(kind, object_ids, deleted=False):
+    """Log changes to ``object_ids`` once the current transaction commits"""
+    object_ids = list(dict.fromkeys(object_ids))
+    if not object_ids:
+        return
+
+    def write():
+        now = timezone.now()
+        ChangeLog.objects.bulk_create([
+            ChangeLog(kind=kind, object_id=object_id, deleted=deleted, changed_at=now)
+            for object_id in object_ids
+        ])
+    transaction.on_commit(write)
+
+
+def encode_token(sequence, issued_at=None):
+    payload = {'seq': sequence, 'at': int(issued_at if issued_at is not None else time.time())}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode('ascii')).decode('ascii')
+
+
+def decode_token(token):
+    """``(sequence, issued_at)`` of a sync token; a missing token starts from the beginning"""
+    if not token:
+        return 0, None
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+        sequence, issued_at = int(payload['seq']), int(payload['at'])
+    except Exception:
+        raise InvalidSyncToken('Invalid sync token')
+    if sequence < 0:
+        raise InvalidSyncToken('Invalid sync token')
+    retention = timedelta(days=getattr(settings, 'SYNC_TOMBSTONE_RETENTION_DAYS', 30))
+    if issued_at < (timezone.now() - retention).timestamp():
+        raise ExpiredSyncToken('Sync token expired, sync again without a token')
+    return sequence, issued_at
+
+
+def read_changes(since, limit):
+    """Latest state per object among the settled entries after ``since``.
+
+    Returns ``({kind: {object_id: deleted}}, last_sequence, has_more)``.
+    """
+    horizon = timezone.now() - timedelta(seconds=getattr(settings, 'SYNC_SETTLE_SECONDS', 5))
+    entries = list(
+        ChangeLog.objects.filter(id__gt=since).order_by('id')
+        .values_list('id', 'kind', 'object_id', 'deleted', 'changed_at')[:limit + 1]
+    )
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    for position, entry in enumerate(entries):
+        if entry[4] > horizon:
+            entries = entries[:position]
+            has_more = False
+            break
+
+    changes = defaultdict(dict)
+    for _, kind, object_id, deleted, _ in entries:
+        changes[kind][object_id] = deleted
+    return changes, entries[-1][0] if entries else since, has_more
+
+
+def _reports(ids, context):
+    queryset = Report.objects.filter(id__in=ids).order_by('id')
+    related = {pk: rest for pk, *rest in queryset.values_list('id', 'category_id', 'reporter_id')}
+    rows = ReportRows(REPORT_SYNC_FIELDS, context=context).serialize(queryset)
+    for row in rows:
+        row['category'], row['reporter'] = related[row['id']]
+    return rows
+
+
+def _comments(ids, context):
+    queryset = Comment.objects.filter(id__in=ids).order_by('id')
+    related = {pk: rest for pk, *rest in queryset.values_list('id', 'report_id', 'user_id')}
+    rows = CommentRows(COMMENT_SYNC_FIELDS, context=context).serialize(queryset)
+    for row in rows:
+        row['report'], row['user'] = related[row['id']]
+    return rows
+
+
+def _categories(ids, context):
+    return CategorySerializer(Category.objects.filter(id__in=ids), many=True, context=context).data
+
+
+def _media(model, serializer_class):
+    def load(ids, context):
+        rows = []
+        for media in model.objects.filter(id__in=ids).order_by('id'):
+            data = serializer_class(media, context=context).data
+            data['report'] = media.report_id
+            rows.append(data)
+        return rows
+    return load
+
+
+LOADERS = {
+    'report': _reports,
+    'comment': _comments,
+    'category': _categories,
+    'image': _media(ReportImage, ReportImageSerializer),
+    'video': _media(ReportVideo, ReportVideoSerializer),
+}
+
+
+def sync_page(token=None, context=None, limit=None):
+    """One page of changes after ``token`` with the token for the next call"""
+    since, _ = decode_token(token)
+    issued_at = time.time()
+    limit = limit or getattr(settings, 'SYNC_PAGE_SIZE', 500)
+    changes, last_sequence, has_more = read_changes(since, limit)
+
+    data = {}
+    for kind, section in SYNC_SECTIONS.items():
+        states = changes.get(kind, {})
+        wanted = [object_id for object_id, deleted in states.items() if not deleted]
+        changed = LOADERS[kind](wanted, context or {}) if wanted else []
+        found = {row['id'] for row in changed}
+        # Rows deleted after the entries on this page are reported as deleted
+        # now; their tombstones on a later page repeat that harmlessly.
+        deleted = [object_id for object_id, is_deleted in states.items() if is_deleted or object_id not in found]
+        data[section] = {'changed': changed, 'deleted': sorted(deleted)}
+
+    data['next'] = encode_token(last_sequence, issued_at)
+    data['has_more'] = has_more
+    return data
+
+
+def backfill_changes(batch_size=1000):
+    """Log every existing row that has no entry yet, so a token-less sync returns everything"""
+    total = 0
+    for model, kind in SYNC_KINDS.items():
+        missing = model.objects.exclude(
+            id__in=ChangeLog.objects.filter(kind=kind).values('object_id')
+        ).order_by('id').values_list('id', flat=True)
+        batch = []
+        for object_id in missing.iterator():
+            batch.append(ChangeLog(kind=kind, object_id=object_id))
+            if len(batch) >= batch_size:
+                total += len(ChangeLog.objects.bulk_create(batch))
+                batch = []
+        total += len(ChangeLog.objects.bulk_create(batch))
+    return total
+
+
+def compact_changes(retention=None):
+    """Drop superseded entries and tombstones older than ``retention``.
+
+    The latest entry of every object is kept, so compaction never changes
+    what any valid token syncs to. Returns ``(superseded, tombstones)``.
+    """
+    if retention is None:
+        retention = timedelta(days=getattr(settings, 'SYNC_TOMBSTONE_RETENTION_DAYS', 30))
+    newer = ChangeLog.objects.filter(kind=OuterRef('kind'), object_id=OuterRef('object_id'), id__gt=OuterRef('id'))
+    superseded, _ = ChangeLog.objects.filter(Exists(newer)).delete()
+    tombstones, _ = ChangeLog.objects.filter(deleted=True, changed_at__lt=timezone.now() - retention).delete()
+    return superseded, tombstones
@@ -1,3 +1,781 @@
-from django.test import TestCase
+import json
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock, skipIf
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from rest_framework.test import APIClient, APIRequestFactory
+
+from . import analytics
+from .analytics import _percentile_rows, sla_analytics
+from .archive import archive_reports, archived_report_data, restore_reports
+from .fast_serializers import CommentRows, ReportRows
+from .blobs import acquire, collect_garbage
+from .bulk import BulkUpdateTooLarge, bulk_update_reports
+from .duplicates import find_duplicates, text_signature
+from .models import (
+    ArchivedReport, Category, ChangeLog, Comment, MediaBlob, Report, ReportImage, ReportVideo, StatusTransition
+)
+from .stats import close_worker_connections, dashboard_statistics_queries, run_sequentially
+from .storage import blob_key, media_storage
+from . import reference
+from .renderers import FastJSONRenderer
+from .sync import sync_page
+from .serializers import CommentSerializer, ReportSerializer
+
+
+class CompiledSerializerParityTests(TestCase):
+    """The compiled values() serializers must match the DRF serializers exactly"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reporter = User.objects.create_user('reporter', 'reporter@example.com', 'pw')
+        cls.staff = User.objects.create_user('staff', 'staff@example.com', 'pw', is_staff=True)
+        category = Category.objects.create(name='Water', icon='fa-water')
+
+        cls.report = Report.objects.create(
+            title='Oil spill', description='Oil on the beach', location_name='Harbour',
+            latitude='-6.123456', longitude='106.654321', category=category,
+            reporter=cls.reporter, severity='high'
+        )
+        Report.objects.create(
+            title='Illegal dump', description='Plastic by the road', location_name='Road 5',
+            latitude='1.5', longitude='2.25', reporter=cls.staff, status='resolved'
+        )
+        ReportImage.objects.create(report=cls.report, image='reports/2024/01/01/spill.jpg', is_primary=True, size=10)
+        ReportImage.objects.create(report=cls.report, image='reports/2024/01/01/beach.jpg', caption='Beach')
+        ReportVideo.objects.create(report=cls.report, video='reports/videos/2024/01/01/spill.mp4', duration=12)
+
+        top = Comment.objects.create(report=cls.report, user=cls.reporter, content='Still there')
+        reply = Comment.objects.create(report=cls.report, user=cls.staff, content='On it', parent=top, is_staff_response=True)
+        Comment.objects.create(report=cls.report, user=cls.reporter, content='Thanks', parent=reply)
+        Comment.objects.create(report=cls.report, user=cls.staff, content='Second thread', is_hidden=True)
+        top.helpful_votes.add(cls.staff)
+        reply.helpful_votes.add(cls.reporter)
+
+    def _request(self, user):
+        request = Request(APIRequestFactory().get('/api/reports/'))
+        request.user = user
+        return request
+
+    def _render(self, data, renderer):
+        return json.loads(renderer.render(data))
+
+    def assertReportParity(self, user, fields=None, expand=None):
+        context = {'request': self._request(user)}
+        queryset = Report.objects.order_by('-created_at')
+        expected = ReportSerializer(queryset, many=True, context=context, fields=fields, expand=expand).data
+        actual = ReportRows(fields, expand, context=context).serialize(queryset)
+        self.assertEqual(self._render(actual, FastJSONRenderer()), self._render(expected, JSONRenderer()))
+
+    def test_report_list_parity(self):
+        self.assertReportParity(self.reporter)
+        self.assertReportParity(self.staff)
+
+    def test_report_list_parity_with_field_selection(self):
+        self.assertReportParity(self.reporter, fields={'id', 'latitude', 'longitude', 'severity'})
+        self.assertReportParity(self.reporter, expand={'category', 'images'})
+        self.assertReportParity(self.reporter, fields={'id', 'title', 'comments'})
+
+    def test_report_parity_without_request(self):
+        queryset = Report.objects.order_by('-created_at')[:5]
+        expected = ReportSerializer(queryset, many=True).data
+        self.assertEqual(
+            self._render(ReportRows().serialize(queryset), FastJSONRenderer()),
+            self._render(expected, JSONRenderer())
+        )
+
+    def test_comment_list_parity(self):
+        for user in (self.reporter, self.staff):
+            context = {'request': self._request(user)}
+            queryset = Comment.objects.filter(report=self.report, parent=None).order_by('-created_at')
+            expected = CommentSerializer(queryset, many=True, context=context).data
+            actual = CommentRows(context=context).serialize(queryset)
+            self.assertEqual(self._render(actual, FastJSONRenderer()), self._render(expected, JSONRenderer()))
+
+    def test_comment_parity_with_field_selection(self):
+        context = {'request': self._request(self.reporter)}
+        queryset = Comment.objects.all()
+        for fields, expand in ((None, {'user'}), ({'id', 'content', 'replies'}, None)):
+            expected = CommentSerializer(queryset, many=True, context=context, fields=fields, expand=expand).data
+            actual = CommentRows(fields, expand, context=context).serialize(queryset)
+            self.assertEqual(self._render(actual, FastJSONRenderer()), self._render(expected, JSONRenderer()))
+
+
+class ArchiveRoundTripTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('citizen', 'citizen@example.com', 'pw')
+        self.report = Report.objects.create(
+            title='Burning waste', description='Smoke every evening', location_name='Field',
+            latitude='3.1', longitude='101.7', reporter=self.user, status='resolved'
+        )
+        ReportImage.objects.create(report=self.report, image='reports/2024/01/01/smoke.jpg')
+        comment = Comment.objects.create(report=self.report, user=self.user, content='Fixed now')
+        Comment.objects.create(report=self.report, user=self.user, content='Confirmed', parent=comment)
+        self.report.upvotes.add(self.user)
+
+    def _context(self):
+        request = Request(APIRequestFactory().get('/api/reports/'))
+        request.user = self.user
+        return {'request': request}
+
+    def test_archive_and_restore(self):
+        context = self._context()
+        before = json.loads(JSONRenderer().render(ReportSerializer(Report.objects.get(pk=self.report.pk), context=context).data))
+
+        archived_ids = archive_reports([self.report.pk], timezone.now() + timedelta(days=1))
+        self.assertEqual(archived_ids, [self.report.pk])
+        self.assertFalse(Report.objects.filter(pk=self.report.pk).exists())
+        self.assertFalse(Comment.objects.filter(report_id=self.report.pk).exists())
+
+        archived = json.loads(JSONRenderer().render(
+            archived_report_data(ArchivedReport.objects.get(pk=self.report.pk), context)
+        ))
+        self.assertTrue(archived.pop('archived'))
+        self.assertEqual(archived, before)
+
+        self.assertEqual(restore_reports([self.report.pk]), [self.report.pk])
+        restored = Report.objects.get(pk=self.report.pk)
+        self.assertEqual(
+            json.loads(JSONRenderer().render(ReportSerializer(restored, context=context).data)), before
+        )
+        self.assertEqual(list(restored.upvotes.all()), [self.user])
+        self.assertFalse(ArchivedReport.objects.exists())
+
+    def test_archived_listing_is_paged_with_bulk_loads(self):
+        for number in range(3):
+            report = Report.objects.create(
+                title=f'Smoke {number}', description='Smoke again', location_name='Field',
+                latitude='3.1', longitude='101.7', reporter=self.user, status='resolved'
+            )
+            Comment.objects.create(report=report, user=self.user, content='Seen it too')
+        archive_reports(Report.objects.values_list('id', flat=True), timezone.now() + timedelta(days=1))
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        def count(page_size):
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get(f'/api/reports/?include_archived=true&archived_page_size={page_size}')
+            return len(queries), response
+
+        small, _ = count(1)
+        large, response = count(3)
+        self.assertEqual(small, large)
+        self.assertEqual(len(response.json()), 3)
+        self.assertTrue(all(row['archived'] for row in response.json()))
+
+        seen = []
+        url = '/api/reports/?include_archived=true&archived_page_size=3'
+        while url:
+            response = client.get(url)
+            seen += [row['id'] for row in response.json()]
+            link = response.headers.get('Link')
+            url = link[1:link.index('>')] if link else None
+        self.assertEqual(sorted(seen), sorted(ArchivedReport.objects.values_list('id', flat=True)))
+        self.assertEqual(len(seen), 4)
+
+    def test_status_history_stays_in_analytics(self):
+        cache.clear()
+        before = sla_analytics(group_by='severity')
+        archive_reports([self.report.pk], timezone.now() + timedelta(days=1))
+        self.assertEqual(StatusTransition.objects.filter(archived_report_id=self.report.pk).count(), 1)
+        cache.clear()
+        self.assertEqual(sla_analytics(group_by='severity'), before)
+
+        restore_reports([self.report.pk])
+        self.assertEqual(StatusTransition.objects.filter(report_id=self.report.pk).count(), 1)
+        self.assertFalse(StatusTransition.objects.filter(archived_report__isnull=False).exists())
+
+    def test_open_reports_are_not_archived(self):
+        self.report.status = 'in_progress'
+        self.report.save()
+        self.assertEqual(archive_reports([self.report.pk], timezone.now() + timedelta(days=1)), [])
+
+
+class ContentAddressedMediaTests(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        user = User.objects.create_user('uploader', 'uploader@example.com', 'pw')
+        self.report = Report.objects.create(
+            title='Dead fish', description='Many dead fish', location_name='Lake',
+            latitude='0.5', longitude='0.5', reporter=user
+        )
+
+    def _upload(self, content, name='photo.jpg'):
+        return ReportVideo.objects.create(report=self.report, video=SimpleUploadedFile(name, content))
+
+    def test_identical_uploads_share_one_blob(self):
+        first = self._upload(b'same bytes')
+        second = self._upload(b'same bytes', name='retry.JPG')
+        other = self._upload(b'other bytes')
+
+        self.assertTrue(first.video.name.startswith('cas/'))
+        self.assertEqual(first.video.name, second.video.name)
+        self.assertNotEqual(first.video.name, other.video.name)
+        self.assertEqual(MediaBlob.objects.get(name=blob_key(first.video.name)).ref_count, 2)
+
+    def test_extension_does_not_split_blobs(self):
+        jpeg = self._upload(b'same bytes', name='photo.jpg')
+        png = self._upload(b'same bytes', name='photo.png')
+        self.assertNotEqual(jpeg.video.name, png.video.name)
+        self.assertEqual(media_storage.path(jpeg.video.name), media_storage.path(png.video.name))
+        self.assertEqual(MediaBlob.objects.get().ref_count, 2)
+
+    def test_acquire_stores_a_collected_blob_again(self):
+        upload = SimpleUploadedFile('photo.jpg', b'recycled')
+        name = media_storage.save('photo.jpg', upload)
+        # Collected after the upload found the file but before it took its reference
+        media_storage.delete(name)
+        acquire(name, content=upload)
+        self.assertTrue(media_storage.exists(name))
+        self.assertEqual(MediaBlob.objects.get(name=blob_key(name)).ref_count, 1)
+
+    def test_deleting_an_archived_report_releases_its_media(self):
+        name = self._upload(b'archived bytes').video.name
+        Report.objects.filter(pk=self.report.pk).update(status='resolved')
+        archive_reports([self.report.pk], timezone.now() + timedelta(days=1))
+        self.assertEqual(MediaBlob.objects.get(name=blob_key(name)).ref_count, 1)
+        ArchivedReport.objects.get(pk=self.report.pk).delete()
+        blob = MediaBlob.objects.get(name=blob_key(name))
+        self.assertEqual(blob.ref_count, 0)
+        self.assertIsNotNone(blob.orphaned_at)
+
+    def test_unreferenced_blobs_are_collected(self):
+        first = self._upload(b'short lived')
+        second = self._upload(b'short lived')
+        name = first.video.name
+
+        first.delete()
+        self.assertEqual(collect_garbage(grace=timedelta(0)), (0, 0))
+        second.delete()
+        blob = MediaBlob.objects.get(name=blob_key(name))
+        self.assertEqual(blob.ref_count, 0)
+        MediaBlob.objects.filter(pk=blob.pk).update(orphaned_at=timezone.now() - timedelta(hours=2))
+        self.assertEqual(collect_garbage(grace=timedelta(hours=1)), (0, 0))  # file mtime is still recent
+
+        self.assertEqual(collect_garbage(grace=timedelta(0)), (1, len(b'short lived')))
+        self.assertFalse(media_storage.exists(name))
+        self.assertFalse(MediaBlob.objects.exists())
+
+
+class MediaDeliveryTests(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.owner = User.objects.create_user('owner', 'owner@example.com', 'pw')
+        self.report = Report.objects.create(
+            title='Foam on river', description='White foam', location_name='Bridge',
+            latitude='0.1', longitude='0.1', reporter=self.owner, is_public=False
+        )
+        video = ReportVideo.objects.create(report=self.report, video=SimpleUploadedFile('clip.mp4', b'0123456789'))
+        self.url = f'/media/{video.video.name}'
+
+    def test_private_media_requires_access(self):
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.client.force_login(self.owner)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('immutable', response['Cache-Control'])
+
+    def test_range_requests(self):
+        self.client.force_login(self.owner)
+        response = self.client.get(self.url, HTTP_RANGE='bytes=2-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+        self.assertEqual(b''.join(response.streaming_content), b'2345')
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-3')
+        self.assertEqual(b''.join(response.streaming_content), b'789')
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE='bytes=20-').status_code, 416)
+
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_archived_report_media(self):
+        Report.objects.filter(pk=self.report.pk).update(status='resolved')
+        archive_reports([self.report.pk], timezone.now() + timedelta(days=1))
+        stranger = User.objects.create_user('stranger', 'stranger@example.com', 'pw')
+        self.client.force_login(stranger)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.client.force_login(self.owner)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    def test_unknown_paths_skip_the_database(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/media/cas/00/00/missing.jpg').status_code, 404)
+
+
+@override_settings(SYNC_SETTLE_SECONDS=0)
+class DeltaSyncTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('inspector', 'inspector@example.com', 'pw')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category = Category.objects.create(name='Air')
+            self.report = Report.objects.create(
+                title='Smog', description='Thick smog', location_name='Centre',
+                latitude='1.0', longitude='1.0', reporter=self.user, category=self.category
+            )
+            self.comment = Comment.objects.create(report=self.report, user=self.user, content='Still smoggy')
+
+    def _sync(self, token=None, limit=None):
+        request = Request(APIRequestFactory().get('/api/sync/'))
+        request.user = self.user
+        return sync_page(token, {'request': request}, limit)
+
+    def test_full_then_incremental_sync(self):
+        first = self._sync()
+        self.assertEqual([row['id'] for row in first['reports']['changed']], [self.report.pk])
+        self.assertEqual(first['comments']['changed'][0]['report'], self.report.pk)
+        self.assertEqual(first['comments']['changed'][0]['user'], self.user.pk)
+        self.assertEqual(first['reports']['changed'][0]['category'], self.category.pk)
+        self.assertEqual(first['reports']['changed'][0]['reporter'], self.user.pk)
+        self.assertEqual([row['name'] for row in first['categories']['changed']], ['Air'])
+        self.assertFalse(first['has_more'])
+
+        unchanged = self._sync(first['next'])
+        self.assertEqual(unchanged['reports'], {'changed': [], 'deleted': []})
+
+        comment_id = self.comment.pk
+        with self.captureOnCommitCallbacks(execute=True):
+            self.report.status = 'investigating'
+            self.report.save()
+            self.comment.delete()
+        delta = self._sync(first['next'])
+        self.assertEqual([row['status'] for row in delta['reports']['changed']], ['investigating'])
+        self.assertEqual(delta['comments'], {'changed': [], 'deleted': [comment_id]})
+        self.assertEqual(delta['categories']['changed'], [])
+
+    def test_category_change_does_not_resend_reports(self):
+        token = self._sync()['next']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.name = 'Air quality'
+            self.category.save()
+        self.assertEqual(ChangeLog.objects.filter(kind='report').count(), 1)
+        delta = self._sync(token)
+        self.assertEqual([row['name'] for row in delta['categories']['changed']], ['Air quality'])
+        self.assertEqual(delta['reports']['changed'], [])
+
+    def test_paging(self):
+        page = self._sync(limit=2)
+        self.assertTrue(page['has_more'])
+        rest = self._sync(page['next'], limit=2)
+        self.assertFalse(rest['has_more'])
+        self.assertEqual(len(rest['comments']['changed']), 1)
+
+
+class ReferenceCacheTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('citizen', 'citizen@example.com', 'pw')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.water = Category.objects.create(name='Water')
+            Category.objects.create(name='Air')
+
+    def test_category_changes_reload_the_cache(self):
+        self.assertEqual([category.name for category in reference.categories()], ['Air', 'Water'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.water.name = 'Rivers'
+            self.water.save()
+        self.assertEqual(reference.get_category(self.water.pk).name, 'Rivers')
+
+    def test_category_created_elsewhere_is_loaded_on_miss(self):
+        reference.categories()
+        # Bypasses the invalidation signal, like a write from another process
+        Category.objects.bulk_create([Category(name='Soil')])
+        soil = Category.objects.get(name='Soil')
+        self.assertEqual(reference.get_category(soil.pk).name, 'Soil')
+        self.assertIsNone(reference.get_category(soil.pk + 1000))
+
+    def test_snapshot_is_reloaded_after_max_age(self):
+        reference.categories()
+        Category.objects.filter(pk=self.water.pk).update(name='Rivers')
+        with override_settings(REFERENCE_CACHE_CHECK_SECONDS=0, REFERENCE_CACHE_MAX_AGE=0):
+            self.assertEqual(reference.get_category(self.water.pk).name, 'Rivers')
+
+    def test_reporter_categories_follow_reports(self):
+        self.assertEqual(reference.reporter_category_ids(self.user.pk), set())
+        with self.captureOnCommitCallbacks(execute=True):
+            Report.objects.create(
+                title='Murky water', description='Brown water', location_name='Well',
+                latitude='0.2', longitude='0.2', reporter=self.user, category=self.water
+            )
+        self.assertEqual(reference.reporter_category_ids(self.user.pk), {self.water.pk})
+
+    def test_reporter_categories_survive_unrelated_saves(self):
+        report = Report.objects.create(
+            title='Murky water', description='Brown water', location_name='Well',
+            latitude='0.2', longitude='0.2', reporter=self.user, category=self.water
+        )
+        report = Report.objects.get(pk=report.pk)
+        with mock.patch('reports.reference.forget_reporter_categories') as forget:
+            report.status = 'investigating'
+            report.save()
+            Report.objects.only('id', 'title').get(pk=report.pk).save(update_fields=['title'])
+            forget.assert_not_called()
+            report.category = None
+            report.save()
+            forget.assert_called_once_with(self.user.pk)
+
+    def test_dashboard_statistics_include_empty_categories(self):
+        Report.objects.create(
+            title='Murky water', description='Brown water', location_name='Well',
+            latitude='0.2', longitude='0.2', reporter=self.user, category=self.water
+        )
+        stats = run_sequentially(dashboard_statistics_queries(self.user))
+        self.assertEqual(stats['reports_by_category'], [
+            {'name': 'Air', 'report_count': 0},
+            {'name': 'Water', 'report_count': 1},
+        ])
+
+
+class AsyncDashboardTests(TransactionTestCase):
+    """The async endpoints run their queries on pool threads, which only see committed data"""
+
+    def setUp(self):
+        self.addCleanup(close_worker_connections)
+        self.user = User.objects.create_user('viewer', 'viewer@example.com', 'pw')
+        category = Category.objects.create(name='Noise')
+        Category.objects.create(name='Soil')
+        for severity in ('low', 'high', 'high'):
+            Report.objects.create(
+                title='Loud factory', description='Noise at night', location_name='Estate',
+                latitude='4.0', longitude='4.0', reporter=self.user, category=category, severity=severity
+            )
+
+    def test_matches_sync_endpoints(self):
+        self.client.force_login(self.user)
+        for name in ('dashboard_stats', 'dashboard_statistics'):
+            sync = self.client.get(f'/api/reports/{name}/')
+            concurrent = self.client.get(f'/api/async/reports/{name}/')
+            self.assertEqual(concurrent.status_code, 200)
+            self.assertEqual(concurrent.json(), sync.json())
+
+    def test_requires_authentication(self):
+        self.assertEqual(self.client.get('/api/async/reports/dashboard_statistics/').status_code, 401)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.post('/api/async/reports/dashboard_statistics/').status_code, 405)
+
+
+class StatusTransitionTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.start = timezone.now().replace(microsecond=0)
+        self.user = User.objects.create_user('tracker', 'tracker@example.com', 'pw')
+        with self._at(0):
+            self.report = Report.objects.create(
+                title='Leaking drum', description='Chemical drum leaking', location_name='Depot',
+                latitude='2.0', longitude='2.0', reporter=self.user, severity='high'
+            )
+
+    def _at(self, seconds):
+        return mock.patch('django.utils.timezone.now', return_value=self.start + timedelta(seconds=seconds))
+
+    def _move(self, status, seconds):
+        with self._at(seconds):
+            self.report.status = status
+            self.report.save()
+
+    def _log(self):
+        return list(self.report.status_transitions.values_list(
+            'from_status', 'to_status', 'seconds_in_from_status', 'seconds_since_created'
+        ))
+
+    def test_transitions_through_resolution_and_reopen(self):
+        self._move('investigating', 100)
+        self._move('resolved', 300)
+        self._move('pending', 400)
+        self.assertEqual(self._log(), [
+            ('', 'pending', None, 0),
+            ('pending', 'investigating', 100, 100),
+            ('investigating', 'resolved', 200, 300),
+            ('resolved', 'pending', 100, 400),
+        ])
+        self.assertEqual(self.report.resolved_at, self.start + timedelta(seconds=300))
+
+    def test_saves_without_status_change_are_not_logged(self):
+        self.report.title = 'Leaking drums'
+        self.report.save()
+        deferred = Report.objects.only('id', 'title').get(pk=self.report.pk)
+        deferred.title = 'Leaking barrels'
+        deferred.save(update_fields=['title'])
+        self.assertEqual(len(self._log()), 1)
+
+    @skipIf(analytics.np is None, 'NumPy is not installed')
+    def test_sla_analytics(self):
+        other = Report.objects.create(
+            title='Dust', description='Dust cloud', location_name='Quarry',
+            latitude='2.5', longitude='2.5', reporter=self.user, severity='low'
+        )
+        self._move('resolved', 600)
+        with self._at(60):
+            other.status = 'resolved'
+            other.save()
+
+        result = sla_analytics(group_by='severity')
+        self.assertEqual(
+            {row['key']: row['count'] for row in result['time_to_resolve']}, {'high': 1, 'low': 1}
+        )
+        high = next(row for row in result['time_to_resolve'] if row['key'] == 'high')
+        self.assertEqual(high['p50'], 600.0)
+        self.assertEqual(sla_analytics()['time_in_state']['pending'][0]['count'], 2)
+        with self.assertRaises(ValueError):
+            sla_analytics(group_by='colour')
+
+    @skipIf(analytics.np is None, 'NumPy is not installed')
+    def test_percentile_rows(self):
+        rows = [('a', 10), ('b', 1), ('a', 20), ('a', 30), ('b', 3)]
+        self.assertEqual(_percentile_rows(iter(rows), True), [
+            {'key': 'a', 'count': 3, 'p50': 20.0, 'p90': 28.0, 'p99': 29.8},
+            {'key': 'b', 'count': 2, 'p50': 2.0, 'p90': 2.8, 'p99': 2.98},
+        ])
+        self.assertEqual(_percentile_rows(iter([5, 15]), False), [
+            {'key': None, 'count': 2, 'p50': 10.0, 'p90': 14.0, 'p99': 14.9},
+        ])
+        self.assertEqual(_percentile_rows(iter([]), True), [])
+
+    def test_sla_analytics_without_numpy(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user('auditor', 'auditor@example.com', 'pw', is_staff=True))
+        with mock.patch.object(analytics, 'np', None):
+            response = client.get('/api/reports/sla_analytics/')
+        self.assertEqual(response.status_code, 501)
+        self.assertIn('NumPy', response.json()['error'])
+
+
+class TriagePaginationTests(TestCase):
+
+    def setUp(self):
+        self.staff = User.objects.create_user('triager', 'triager@example.com', 'pw', is_staff=True)
+        for priority in (1, 3, 3, 3, 1, 5):
+            Report.objects.create(
+                title='Open report', description='Needs triage', location_name='Town',
+                latitude='5.0', longitude='5.0', reporter=self.staff, priority=priority
+            )
+        # Several rows within one millisecond exercise the datetime tie-break
+        Report.objects.filter(priority=3).update(created_at=timezone.now().replace(microsecond=123456))
+        Report.objects.filter(priority=1).update(created_at=timezone.now().replace(microsecond=123789))
+
+    def test_pages_visit_each_report_once(self):
+        self.client.force_login(self.staff)
+        url, seen = '/api/triage/unassigned/?page_size=2', []
+        while url:
+            page = self.client.get(url).json()
+            seen += [row['id'] for row in page['results']]
+            url = page['next']
+            self.assertLessEqual(len(seen), 6)
+        expected = list(Report.objects.order_by('-priority', 'created_at', 'id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+
+class DuplicateDetectionTests(TestCase):
+    text = 'Oil slick spreading on the river next to the old bridge'
+
+    def setUp(self):
+        self.user = User.objects.create_user('walker', 'walker@example.com', 'pw')
+        self.original = self._report(self.text, '1.0001', '1.0001')
+        self._report(self.text, '9.0', '9.0')  # far away
+        self._report('Dead trees along the hiking trail', '1.0002', '1.0002')  # unrelated
+        self._report(self.text, '1.0003', '1.0003', status='resolved')  # closed
+
+    def _report(self, description, latitude, longitude, **extra):
+        return Report.objects.create(
+            title='River pollution', description=description, location_name='River',
+            latitude=latitude, longitude=longitude, reporter=self.user, **extra
+        )
+
+    def test_find_duplicates(self):
+        report = self._report(self.text.replace('old', 'historic'), '1.0004', '1.0004')
+        matches = find_duplicates(report)
+        self.assertEqual([match['id'] for match in matches], [self.original.pk])
+        self.assertGreaterEqual(matches[0]['similarity'], 0.5)
+
+    def test_create_returns_possible_duplicates(self):
+        self.client.force_login(self.user)
+        response = self.client.post('/api/reports/', {
+            'title': 'River pollution', 'description': self.text, 'location_name': 'Bridge',
+            'latitude': '1.0004', 'longitude': '1.0004',
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([match['id'] for match in response.json()['possible_duplicates']], [self.original.pk])
+
+    def test_fingerprint_only_recomputed_when_source_changes(self):
+        report = Report.objects.get(pk=self.original.pk)
+        with mock.patch('reports.models.text_signature', wraps=text_signature) as signature:
+            report.status = 'investigating'
+            report.save()
+            self.assertEqual(signature.call_count, 0)
+            report.description = 'Oil slick has reached the harbour'
+            report.save()
+            self.assertEqual(signature.call_count, 1)
+            report.title = 'Harbour pollution'
+            report.save(update_fields=['title'])
+            self.assertEqual(signature.call_count, 2)
+        self.assertEqual(
+            Report.objects.get(pk=report.pk).text_signature,
+            text_signature('Harbour pollution Oil slick has reached the harbour')
+        )
+
+
+class SparseFieldsTests(TestCase):
+    """?fields= and ?expand= must shrink both the payload and the queries run"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('mapper', 'mapper@example.com', 'pw')
+        category = Category.objects.create(name='Waste')
+        for number in range(3):
+            report = Report.objects.create(
+                title=f'Dump {number}', description='Rubbish pile', location_name='Lot',
+                latitude='7.0', longitude='7.0', reporter=cls.user, category=category
+            )
+            ReportImage.objects.create(report=report, image=f'reports/2024/01/01/dump{number}.jpg')
+            comment = Comment.objects.create(report=report, user=cls.user, content='Growing')
+            Comment.objects.create(report=report, user=cls.user, content='Still there', parent=comment)
+        cls.report = report
+
+    def setUp(self):
+        # Authenticating without the session keeps auth queries out of the counts
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _count(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+
+    def test_report_list(self):
+        with self.assertNumQueries(1):
+            sparse = self.client.get('/api/reports/?fields=id,title').json()
+        self.assertEqual([set(row) for row in sparse], [{'id', 'title'}] * 3)
+
+        with self.assertNumQueries(2):
+            expanded = self.client.get('/api/reports/?fields=id&expand=images').json()
+        self.assertEqual([set(row) for row in expanded], [{'id', 'images'}] * 3)
+
+        full_queries, full = self._count('/api/reports/')
+        self.assertGreater(full_queries, 2)
+        self.assertGreater(len(full.content), len(json.dumps(sparse)))
+
+    def test_report_retrieve(self):
+        url = f'/api/reports/{self.report.pk}/'
+        with self.assertNumQueries(1):
+            self.assertEqual(set(self.client.get(f'{url}?fields=id,title').json()), {'id', 'title'})
+        with self.assertNumQueries(2):
+            data = self.client.get(f'{url}?fields=id,images').json()
+        self.assertEqual(set(data), {'id', 'images'})
+        self.assertEqual(len(data['images']), 1)
+
+        full_queries, _ = self._count(url)
+        self.assertGreater(full_queries, 2)
+
+    def test_comment_list(self):
+        with self.assertNumQueries(1):
+            rows = self.client.get('/api/comments/?fields=id,content').json()
+        self.assertEqual([set(row) for row in rows], [{'id', 'content'}] * 6)
+        full_queries, _ = self._count('/api/comments/')
+        self.assertGreater(full_queries, 1)
+
+
+class BulkUpdateTests(TestCase):
+
+    def setUp(self):
+        self.now = timezone.now()
+        self.staff = User.objects.create_user('coordinator', 'coordinator@example.com', 'pw', is_staff=True)
+
+    def _report(self, status='pending'):
+        report = Report.objects.create(
+            title='Blocked drain', description='Water not draining', location_name='Street',
+            latitude='6.0', longitude='6.0', reporter=self.staff
+        )
+        Report.objects.filter(pk=report.pk).update(created_at=self.now - timedelta(days=3, hours=5))
+        report = Report.objects.get(pk=report.pk)
+        if status != 'pending':
+            with mock.patch('django.utils.timezone.now', return_value=self.now - timedelta(days=1)):
+                report.status = status
+                report.save()
+        return report
+
+    def _transitions(self, report):
+        return list(report.status_transitions.order_by('changed_at').values_list(
+            'from_status', 'to_status', 'changed_at', 'seconds_in_from_status', 'seconds_since_created'
+        ))
+
+    def test_matches_report_save(self):
+        pairs = [(self._report(status), self._report(status)) for status in ('pending', 'investigating')]
+        with mock.patch('django.utils.timezone.now', return_value=self.now):
+            count, outcomes = bulk_update_reports(
+                Report.objects.filter(pk__in=[bulk.pk for bulk, _ in pairs]),
+                {'status': 'resolved', 'priority': 4}
+            )
+            for _, saved in pairs:
+                saved.status = 'resolved'
+                saved.priority = 4
+                saved.save()
+
+        self.assertEqual(count, 2)
+        self.assertEqual([outcome['outcome'] for outcome in outcomes], ['resolved', 'resolved'])
+        for bulk, saved in pairs:
+            bulk.refresh_from_db()
+            saved.refresh_from_db()
+            for field in ('status', 'priority', 'resolved_at', 'resolution_time_days', 'updated_at'):
+                self.assertEqual(getattr(bulk, field), getattr(saved, field), field)
+            self.assertEqual(bulk.resolution_time_days, 3)
+            self.assertEqual(self._transitions(bulk), self._transitions(saved))
+
+    def test_outcomes(self):
+        resolved = self._report('resolved')
+        pending = self._report()
+        count, outcomes = bulk_update_reports(
+            Report.objects.filter(pk__in=[resolved.pk, pending.pk, 0]),
+            {'status': 'resolved'}, requested_ids=[resolved.pk, pending.pk, 0]
+        )
+        self.assertEqual(count, 2)
+        self.assertEqual(outcomes, [
+            {'id': resolved.pk, 'outcome': 'updated'},
+            {'id': pending.pk, 'outcome': 'resolved'},
+            {'id': 0, 'outcome': 'not_found'},
+        ])
+        # Already resolved: no new transition and the original resolution time is kept
+        self.assertEqual(len(self._transitions(resolved)), 2)
+        self.assertEqual(Report.objects.get(pk=resolved.pk).resolved_at, resolved.resolved_at)
+
+    def test_cap_is_enforced_on_locked_rows(self):
+        reports = [self._report(), self._report()]
+        with self.assertRaises(BulkUpdateTooLarge):
+            bulk_update_reports(Report.objects.all(), {'priority': 5}, max_reports=1)
+        self.assertFalse(Report.objects.filter(priority=5).exists())
+
+        self.client.force_login(self.staff)
+        with override_settings(BULK_UPDATE_MAX_REPORTS=1):
+            response = self.client.post(
+                '/api/reports/bulk_update/', {'filter': {'status': 'pending'}, 'priority': 5},
+                content_type='application/json'
+            )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(reports), Report.objects.exclude(priority=5).count())
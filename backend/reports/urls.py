@@ -1,14 +1,21 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ReportViewSet, CategoryViewSet, CommentViewSet
+from .views import ReportViewSet, CategoryViewSet, CommentViewSet, TriageViewSet, SyncViewSet
 from .views_auth import custom_login
+from . import views_async
 
 router = DefaultRouter()
 router.register(r'reports', ReportViewSet, basename='report')
 router.register(r'categories', CategoryViewSet, basename='category')
 router.register(r'comments', CommentViewSet, basename='comment')
+router.register(r'triage', TriageViewSet, basename='triage')
+router.register(r'sync', SyncViewSet, basename='sync')
 
 urlpatterns = [
     path('', include(router.urls)),
     path('auth/custom-login/', custom_login, name='custom-login'),
+    # Async dashboard endpoints, only concurrent when served through backend.asgi
+    path('async/reports/dashboard_stats/', views_async.dashboard_stats, name='async-dashboard-stats'),
+    path('async/reports/dashboard_statistics/', views_async.dashboard_statistics, name='async-dashboard-statistics'),
+    path('async/reports/<int:pk>/statistics/', views_async.statistics, name='async-report-statistics'),
 ]
@@ -2,14 +2,32 @@ from rest_framework import viewsets, status, filters, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
-from rest_framework.permissions import IsAuthenticated
-from django.db.models import Count
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Prefetch
+from django.http import Http404
+from rest_framework.generics import get_object_or_404
 from django.utils import timezone
 from datetime import timedelta
-from .models import Report, Category, ReportImage, ReportVideo, Comment, ReportSubscription
+from .models import Report, Category, ReportImage, ReportVideo, Comment, ReportSubscription, ArchivedReport
+from .archive import archived_report_data, archived_reports_data, restore_reports
+from .pagination import ArchivedReportPagination, KeysetPagination
 from .serializers import (
-    ReportSerializer, CategorySerializer,
-    ReportImageSerializer, ReportVideoSerializer, CommentSerializer
+    ReportSerializer, CategorySerializer, ReportImageSerializer,
+    ReportVideoSerializer, CommentSerializer, TriageReportSerializer,
+    BulkReportUpdateSerializer, BulkReportFilterSerializer,
+    parse_field_list, relation_requested
+)
+from .analytics import AnalyticsUnavailable, sla_analytics
+from .bulk import bulk_update_reports, BulkUpdateTooLarge, BULK_FIELDS
+from .duplicates import find_duplicates
+from .fast_serializers import ReportRows, CommentRows
+from . import reference
+from .sync import ExpiredSyncToken, InvalidSyncToken, sync_page
+from .stats import (
+    run_sequentially, dashboard_stats_queries,
+    dashboard_statistics_queries, statistics_queries
 )
 from rest_framework.exceptions import ValidationError
 
@@ -20,6 +38,41 @@ class IsOwnerOrStaff(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         return obj.reporter == request.user or request.user.is_staff
 
+class SparseFieldsViewMixin:
+    """
+    Pass ``?fields=`` and ``?expand=`` from read requests to the serializer.
+
+    Querysets should use ``wants_relation`` to join or prefetch only the
+    nested relations the client asked for.
+    """
+    def get_field_selection(self):
+        if self.request.method not in permissions.SAFE_METHODS:
+            return None, None
+        params = self.request.query_params
+        return parse_field_list(params.get('fields')), parse_field_list(params.get('expand'))
+
+    def wants_relation(self, name):
+        return relation_requested(name, *self.get_field_selection())
+
+    def get_serializer(self, *args, **kwargs):
+        fields, expand = self.get_field_selection()
+        kwargs.setdefault('fields', fields)
+        kwargs.setdefault('expand', expand)
+        return super().get_serializer(*args, **kwargs)
+
+def with_comment_relations(queryset, fields=None, expand=None, reply_depth=1):
+    """Add the joins and prefetches CommentSerializer needs for a field selection"""
+    if relation_requested('user', fields, expand):
+        queryset = queryset.select_related('user')
+    if fields is None or fields & {'helpful_count', 'has_voted'}:
+        queryset = queryset.prefetch_related('helpful_votes')
+    if reply_depth > 0 and relation_requested('replies', fields, expand):
+        queryset = queryset.prefetch_related(Prefetch(
+            'replies',
+            queryset=with_comment_relations(Comment.objects.all(), fields, expand, reply_depth - 1)
+        ))
+    return queryset
+
 class CategoryViewSet(viewsets.ModelViewSet):
     serializer_class = CategorySerializer
     permission_classes = [IsAuthenticated]
@@ -28,19 +81,83 @@ class CategoryViewSet(viewsets.ModelViewSet):
         """Filter categories based on user if not staff"""
         if self.request.user.is_staff:
             return Category.objects.all()
-        return Category.objects.filter(reports__reporter=self.request.user).distinct()
+        return Category.objects.filter(id__in=reference.reporter_category_ids(self.request.user.pk))
+
+    def list(self, request, *args, **kwargs):
+        """List categories from the process-local reference cache"""
+        if request.user.is_staff:
+            categories = reference.categories()
+        else:
+            categories = reference.reporter_categories(request.user.pk)
+        return Response(self.get_serializer(categories, many=True).data)
+
+    @action(detail=False, methods=['get'])
+    def choices(self, request):
+        """Report status, severity and priority choices"""
+        return Response(reference.choices())
 
-class ReportViewSet(viewsets.ModelViewSet):
+class ReportViewSet(SparseFieldsViewMixin, viewsets.ModelViewSet):
     serializer_class = ReportSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['title', 'description', 'location_name']
     ordering_fields = ['created_at', 'updated_at', 'severity']
     parser_classes = [MultiPartParser, FormParser, JSONParser]
+    # Actions that serialize model instances straight from get_queryset();
+    # list and dashboard_stats use the compiled values() path instead.
+    prefetch_actions = ('retrieve',)
 
     def get_queryset(self):
         """Get all reports for viewing, but maintain edit restrictions"""
-        return Report.objects.all().select_related('reporter', 'category')
+        queryset = Report.objects.all()
+        related = [name for name in ('reporter', 'category') if self.wants_relation(name)]
+        if related:
+            queryset = queryset.select_related(*related)
+        if self.action in self.prefetch_actions:
+            for name in ('images', 'videos'):
+                if self.wants_relation(name):
+                    queryset = queryset.prefetch_related(name)
+            if self.wants_relation('comments'):
+                queryset = queryset.prefetch_related(
+                    Prefetch('comments', queryset=with_comment_relations(Comment.objects.all()))
+                )
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        """List reports through the compiled values() serializer.
+
+        ``?include_archived=true`` appends one page of matching archived
+        reports after the active ones; the next page is linked from the
+        ``Link: <...>; rel="next-archived"`` header.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        fields, expand = self.get_field_selection()
+        context = self.get_serializer_context()
+        data = ReportRows(fields, expand, context=context).serialize(queryset)
+        headers = {}
+        if self.include_archived():
+            archived = self.filter_queryset(ArchivedReport.objects.all())
+            archived = archived.order_by(*(archived.query.order_by or ['-created_at']), '-id')
+            paginator = ArchivedReportPagination()
+            page = paginator.paginate_queryset(archived, request, view=self)
+            data += archived_reports_data(page, context, fields, expand)
+            next_link = paginator.get_next_link()
+            if next_link:
+                headers['Link'] = f'<{next_link}>; rel="next-archived"'
+        return Response(data, headers=headers)
+
+    def retrieve(self, request, *args, **kwargs):
+        """Retrieve a report, falling back to the archive for archived ones"""
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            archived = get_object_or_404(ArchivedReport.objects.all(), pk=kwargs['pk'])
+            return Response(archived_report_data(
+                archived, self.get_serializer_context(), *self.get_field_selection()
+            ))
+
+    def include_archived(self):
+        return self.request.query_params.get('include_archived', '').lower() in ('1', 'true', 'yes')
 
     def get_permissions(self):
         """Allow viewing for all authenticated users, but restrict edit operations"""
@@ -51,27 +168,18 @@ class ReportViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def dashboard_stats(self, request):
         """Get dashboard statistics including recent reports"""
-        queryset = self.get_queryset()
-        
-        # Get total counts
-        total_reports = queryset.count()
-        resolved_reports = queryset.filter(status='resolved').count()
-        pending_reports = queryset.filter(status='pending').count()
-        
-        # Get recent reports
-        recent_reports = queryset.order_by('-created_at')[:5]
-        recent_reports_data = ReportSerializer(recent_reports, many=True).data
-        
-        return Response({
-            'totalReports': total_reports,
-            'resolvedReports': resolved_reports,
-            'pendingReports': pending_reports,
-            'recentReports': recent_reports_data
-        })
+        return Response(run_sequentially(dashboard_stats_queries(self.get_queryset())))
+
+    def create(self, request, *args, **kwargs):
+        response = super().create(request, *args, **kwargs)
+        # Let the client offer "upvote existing instead" for likely duplicates
+        response.data['possible_duplicates'] = self.possible_duplicates
+        return response
 
     def perform_create(self, serializer):
         """Create a new report with optional image or video"""
         report = serializer.save(reporter=self.request.user)
+        self.possible_duplicates = find_duplicates(report)
         
         # Handle image upload
         if 'image' in self.request.FILES:
@@ -120,6 +228,21 @@ class ReportViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    @action(detail=True, methods=['post'])
+    def upvote(self, request, pk=None):
+        """Toggle the requesting user's upvote on a report"""
+        report = self.get_object()
+        if report.upvotes.filter(pk=request.user.pk).exists():
+            report.upvotes.remove(request.user)
+            upvoted = False
+        else:
+            report.upvotes.add(request.user)
+            upvoted = True
+        return Response({
+            'upvoted': upvoted,
+            'upvotes_count': report.upvotes.count()
+        })
+
     @action(detail=True, methods=['get', 'post'])
     def comments(self, request, pk=None):
         """Create or list comments for a report"""
@@ -136,9 +259,10 @@ class ReportViewSet(viewsets.ModelViewSet):
                 return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
             
             # GET method
+            fields, expand = self.get_field_selection()
             comments = Comment.objects.filter(report=report, parent=None).order_by('-created_at')
-            serializer = CommentSerializer(comments, many=True, context={'request': request})
-            return Response(serializer.data)
+            rows = CommentRows(fields, expand, context={'request': request})
+            return Response(rows.serialize(comments))
         except Exception as e:
             return Response(
                 {'error': str(e)},
@@ -149,82 +273,101 @@ class ReportViewSet(viewsets.ModelViewSet):
     def dashboard_statistics(self, request):
         """Get statistics for the dashboard"""
         try:
-            # Get the last 30 days
-            thirty_days_ago = timezone.now() - timedelta(days=30)
-            
-            # Get total reports
-            total_reports = Report.objects.count()
-            
-            # Get reports in the last 30 days
-            recent_reports = Report.objects.filter(created_at__gte=thirty_days_ago).count()
-            
-            # Get reports by category
-            reports_by_category = Category.objects.annotate(
-                report_count=Count('reports')
-            ).values('name', 'report_count')
-            
-            # Get reports by severity
-            reports_by_severity = Report.objects.values('severity').annotate(
-                count=Count('id')
-            )
-            
-            # Get user's reports count
-            user_reports = Report.objects.filter(reporter=request.user).count()
-            
-            return Response({
-                'total_reports': total_reports,
-                'recent_reports': recent_reports,
-                'reports_by_category': list(reports_by_category),
-                'reports_by_severity': list(reports_by_severity),
-                'user_reports': user_reports
-            })
+            return Response(run_sequentially(dashboard_statistics_queries(request.user)))
         except Exception as e:
             return Response(
                 {'error': str(e)},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-    @action(detail=True, methods=['get'])
-    def statistics(self, request, pk=None):
+    @action(detail=False, methods=['post'])
+    def bulk_update(self, request):
+        """Apply status/assignment/priority/verification changes to many reports at once"""
+        if not request.user.is_staff:
+            return Response(
+                {"error": "Only staff members can bulk update reports"},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        serializer = BulkReportUpdateSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+
+        if 'ids' in data:
+            requested_ids = data['ids']
+            queryset = Report.objects.filter(id__in=requested_ids)
+        else:
+            requested_ids = None
+            queryset = Report.objects.filter(**BulkReportFilterSerializer.to_lookups(data['filter']))
+
+        max_reports = getattr(settings, 'BULK_UPDATE_MAX_REPORTS', 5000)
+        if len(requested_ids or ()) > max_reports:
+            return Response(
+                {"error": f"Bulk updates are limited to {max_reports} reports"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        changes = {field: data[field] for field in BULK_FIELDS if field in data}
         try:
-            # Get base queryset based on user permissions
-            queryset = self.get_queryset()
-            
-            # Calculate statistics
-            total_reports = queryset.count()
-            pending_reports = queryset.filter(status='pending').count()
-            resolved_reports = queryset.filter(status='resolved').count()
-            recent_reports = queryset.filter(
-                created_at__gte=timezone.now() - timedelta(days=7)
-            ).count()
-
-            by_category = queryset.values('category__name').annotate(
-                count=Count('id')
+            updated, outcomes = bulk_update_reports(queryset, changes, requested_ids, max_reports)
+        except BulkUpdateTooLarge as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'updated': updated, 'results': outcomes})
+
+    @action(detail=True, methods=['post'])
+    def restore(self, request, pk=None):
+        """Move an archived report back into the active tables"""
+        if not request.user.is_staff:
+            return Response(
+                {"error": "Only staff members can restore archived reports"},
+                status=status.HTTP_403_FORBIDDEN
             )
-            by_severity = queryset.values('severity').annotate(
-                count=Count('id')
+        archived = get_object_or_404(ArchivedReport.objects.all(), pk=pk)
+        restore_reports([archived.pk])
+        report = self.get_queryset().get(pk=archived.pk)
+        return Response(self.get_serializer(report).data)
+
+    @action(detail=False, methods=['get'])
+    def sla_analytics(self, request):
+        """p50/p90/p99 time-to-resolve and time-in-state, optionally grouped"""
+        if not request.user.is_staff:
+            return Response(
+                {"error": "Only staff members can view SLA analytics"},
+                status=status.HTTP_403_FORBIDDEN
             )
+        try:
+            return Response(sla_analytics(
+                group_by=request.query_params.get('group_by'),
+                start=request.query_params.get('start'),
+                end=request.query_params.get('end'),
+            ))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except AnalyticsUnavailable as e:
+            return Response({'error': str(e)}, status=status.HTTP_501_NOT_IMPLEMENTED)
 
-            return Response({
-                'total_reports': total_reports,
-                'pending_reports': pending_reports,
-                'resolved_reports': resolved_reports,
-                'recent_reports': recent_reports,
-                'by_category': list(by_category),
-                'by_severity': list(by_severity)
-            })
+    @action(detail=True, methods=['get'])
+    def statistics(self, request, pk=None):
+        try:
+            return Response(run_sequentially(statistics_queries(self.get_queryset())))
         except Exception as e:
             return Response(
                 {'error': str(e)},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-class CommentViewSet(viewsets.ModelViewSet):
+class CommentViewSet(SparseFieldsViewMixin, viewsets.ModelViewSet):
     serializer_class = CommentSerializer
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return Comment.objects.select_related('user', 'parent', 'report').prefetch_related('helpful_votes', 'replies')
+        return with_comment_relations(Comment.objects.all(), *self.get_field_selection())
+
+    def list(self, request, *args, **kwargs):
+        """List comments through the compiled values() serializer"""
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = CommentRows(*self.get_field_selection(), context=self.get_serializer_context())
+        return Response(rows.serialize(queryset))
 
     def perform_create(self, serializer):
         report_id = self.request.data.get('report')
@@ -323,4 +466,96 @@ class CommentViewSet(viewsets.ModelViewSet):
             )
             
         comment.save()
-        return Response(self.get_serializer(comment).data)
\ No newline at end of file
+        return Response(self.get_serializer(comment).data)
+
+class TriageViewSet(viewsets.GenericViewSet):
+    """
+    Staff work queues over open reports.
+
+    Each queue is served by a partial index on ``Report`` matching its filter
+    and sort, and is paged with keyset cursors. ``claim`` hands out the next
+    unassigned report using ``SKIP LOCKED`` so concurrent staff never block
+    on, or double-assign, the same row.
+    """
+    serializer_class = TriageReportSerializer
+    permission_classes = [IsAdminUser]
+    pagination_class = KeysetPagination
+    queue_ordering = ('-priority', 'created_at', 'id')
+    claimable_queues = ('unassigned', 'overdue')
+
+    def get_queryset(self):
+        return Report.objects.filter(status__in=Report.OPEN_STATUSES)
+
+    def _queue(self, name):
+        queryset = self.get_queryset()
+        if name == 'unassigned':
+            return queryset.filter(assigned_to__isnull=True).order_by(*self.queue_ordering)
+        if name == 'mine':
+            return queryset.filter(assigned_to=self.request.user).order_by(*self.queue_ordering)
+        if name == 'overdue':
+            overdue_days = getattr(settings, 'TRIAGE_OVERDUE_DAYS', 7)
+            return queryset.filter(
+                created_at__lt=timezone.now() - timedelta(days=overdue_days)
+            ).order_by('created_at', 'id')
+        raise ValidationError(f"Unknown queue: {name}")
+
+    def _paginated(self, queryset):
+        page = self.paginate_queryset(queryset.select_related('category', 'assigned_to'))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['get'])
+    def unassigned(self, request):
+        """Open reports nobody has picked up, most urgent and oldest first"""
+        return self._paginated(self._queue('unassigned'))
+
+    @action(detail=False, methods=['get'])
+    def mine(self, request):
+        """Open reports assigned to the requesting staff member"""
+        return self._paginated(self._queue('mine'))
+
+    @action(detail=False, methods=['get'])
+    def overdue(self, request):
+        """Open reports older than TRIAGE_OVERDUE_DAYS, oldest first"""
+        return self._paginated(self._queue('overdue'))
+
+    @action(detail=False, methods=['post'])
+    def claim(self, request):
+        """Atomically assign the next unassigned report to the requesting user"""
+        queue = request.data.get('queue', 'unassigned')
+        if queue not in self.claimable_queues:
+            return Response(
+                {"error": f"Can only claim from: {', '.join(self.claimable_queues)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        with transaction.atomic():
+            report = (
+                self._queue(queue)
+                .filter(assigned_to__isnull=True)
+                .select_for_update(skip_locked=True, of=('self',))
+                .first()
+            )
+            if report is None:
+                return Response(status=status.HTTP_204_NO_CONTENT)
+            report.assigned_to = request.user
+            report.save(update_fields=['assigned_to', 'updated_at'])
+
+        return Response(self.get_serializer(report).data)
+
+class SyncViewSet(viewsets.GenericViewSet):
+    """Delta sync for offline clients: changes since the token from the previous call"""
+    permission_classes = [IsAuthenticated]
+
+    def list(self, request):
+        """Reports, comments, categories and media changed or deleted since ``?since=``.
+
+        Call again with ``next`` until ``has_more`` is false; without a token
+        everything is returned.
+        """
+        try:
+            return Response(sync_page(request.query_params.get('since'), self.get_serializer_context()))
+        except InvalidSyncToken as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except ExpiredSyncToken as e:
+            return Response({'error': str(e)}, status=status.HTTP_410_GONE)
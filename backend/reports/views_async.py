@@ -0,0 +1,79 @@
+"""
+Async variants of the dashboard endpoints.
+
+These are plain Django async views so they only pay off when the project is
+served through ``backend.asgi``: the independent aggregate queries are run
+concurrently and the response latency tracks the slowest query rather than
+the sum of all of them. The JSON contract matches the ``ReportViewSet``
+actions of the same name.
+"""
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from rest_framework import status
+
+from .models import Report
+from .renderers import FastJSONRenderer
+from .views_auth import authenticate_request
+from .stats import (
+    run_concurrently, dashboard_stats_queries,
+    dashboard_statistics_queries, statistics_queries
+)
+
+
+def _json_response(data, status_code=status.HTTP_200_OK):
+    return HttpResponse(
+        FastJSONRenderer().render(data),
+        content_type='application/json',
+        status=status_code
+    )
+
+
+async def _authenticated_user(request):
+    if request.method != 'GET':
+        return None, _json_response(
+            {'detail': f'Method "{request.method}" not allowed.'},
+            status.HTTP_405_METHOD_NOT_ALLOWED
+        )
+    user = await sync_to_async(authenticate_request)(request)
+    if user is None:
+        return None, _json_response(
+            {'detail': 'Authentication credentials were not provided.'},
+            status.HTTP_401_UNAUTHORIZED
+        )
+    return user, None
+
+
+def _report_queryset():
+    return Report.objects.all().select_related('reporter', 'category')
+
+
+async def dashboard_stats(request):
+    """Get dashboard statistics including recent reports"""
+    user, error = await _authenticated_user(request)
+    if error:
+        return error
+    data = await run_concurrently(dashboard_stats_queries(_report_queryset()))
+    return _json_response(data)
+
+
+async def dashboard_statistics(request):
+    """Get statistics for the dashboard"""
+    user, error = await _authenticated_user(request)
+    if error:
+        return error
+    try:
+        data = await run_concurrently(dashboard_statistics_queries(user))
+    except Exception as e:
+        return _json_response({'error': str(e)}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+    return _json_response(data)
+
+
+async def statistics(request, pk=None):
+    user, error = await _authenticated_user(request)
+    if error:
+        return error
+    try:
+        data = await run_concurrently(statistics_queries(_report_queryset()))
+    except Exception as e:
+        return _json_response({'error': str(e)}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+    return _json_response(data)
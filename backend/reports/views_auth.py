@@ -4,6 +4,24 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+def authenticate_request(request):
+    """Run the configured DRF authentication classes against a plain Django request.
+
+    Returns the authenticated user, or None. Used by views that are not DRF views.
+    """
+    drf_request = Request(
+        request,
+        authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+    )
+    try:
+        user = drf_request.user
+    except APIException:
+        return None
+    return user if user.is_authenticated else None
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
@@ -0,0 +1,153 @@
+"""
+Authorized media delivery.
+
+Media files are only served for reports the requester may see: public
+reports to everyone, non-public ones to their reporter and staff. Once
+access is checked the byte transfer is handed to the front proxy when
+``MEDIA_ACCEL_REDIRECT_PREFIX`` (nginx) or ``MEDIA_SENDFILE`` (Apache/lighttpd)
+is configured. Otherwise the file is streamed from Python with ``Range``/206
+support so video seeking does not re-download from the start.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import http_date, parse_etags, quote_etag
+from django.views.decorators.http import require_safe
+
+from .models import ArchivedReport, ReportImage, ReportVideo
+from .storage import blob_digest, blob_key, is_blob_name, media_storage
+from .views_auth import authenticate_request
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def _owners(path):
+    """(is_public, reporter_id) of every report referencing the media file"""
+    owners = list(ReportImage.objects.filter(image=path).values_list('report__is_public', 'report__reporter_id'))
+    owners += ReportVideo.objects.filter(video=path).values_list('report__is_public', 'report__reporter_id')
+    if not owners:
+        # Media of archived reports stays readable like the reports themselves
+        owners += ArchivedReport.objects.filter(media__name=path).values_list('is_public', 'reporter_id')
+    return owners
+
+
+def _is_allowed(request, owners):
+    if any(is_public for is_public, _ in owners):
+        return True
+    user = authenticate_request(request)
+    if user is None:
+        return False
+    return user.is_staff or any(reporter_id == user.pk for _, reporter_id in owners)
+
+
+def _parse_range(header, size):
+    """(start, end) inclusive byte range, None to serve the whole file, or raise ValueError"""
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        # Malformed or multi-range requests get the full representation
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last or int(last) == 0:
+            raise ValueError('Unsatisfiable range')
+        return max(size - int(last), 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError('Unsatisfiable range')
+    return start, end
+
+
+def _stream(path, start, length):
+    with open(path, 'rb') as media_file:
+        media_file.seek(start)
+        while length > 0:
+            chunk = media_file.read(min(STREAM_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+@require_safe
+def serve_media(request, path):
+    try:
+        full_path = media_storage.path(path)
+    except SuspiciousFileOperation:
+        raise Http404('Media not found')
+
+    # Paths that are not on disk are rejected before any database lookup
+    if not os.path.isfile(full_path):
+        raise Http404('Media not found')
+    owners = _owners(path)
+    # Refuse with 404 rather than 403 so private media does not leak its existence
+    if not owners or not _is_allowed(request, owners):
+        raise Http404('Media not found')
+
+    stat = os.stat(full_path)
+    public = any(is_public for is_public, _ in owners)
+    immutable = is_blob_name(path)
+    etag = quote_etag(blob_digest(path) if immutable else f'{stat.st_size:x}-{int(stat.st_mtime):x}')
+    max_age = getattr(settings, 'MEDIA_CACHE_MAX_AGE', 31536000) if immutable else 3600
+    cache_control = f"{'public' if public else 'private'}, max-age={max_age}"
+    if immutable:
+        cache_control += ', immutable'
+
+    if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+    if etag in if_none_match or '*' in if_none_match:
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        response['Cache-Control'] = cache_control
+        return response
+
+    # Blob files have no extension on disk, the requested name carries the type
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    accel_prefix = getattr(settings, 'MEDIA_ACCEL_REDIRECT_PREFIX', None)
+
+    if accel_prefix:
+        # nginx serves the bytes (including Range) from an internal location
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = f"{accel_prefix.rstrip('/')}/{quote(blob_key(path))}"
+    elif getattr(settings, 'MEDIA_SENDFILE', False):
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = full_path
+    else:
+        response = _file_response(request, full_path, stat.st_size, content_type, etag)
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = cache_control
+    return response
+
+
+def _file_response(request, full_path, size, content_type, etag):
+    range_header = request.headers.get('Range')
+    if_range = request.headers.get('If-Range')
+    if range_header and (not if_range or if_range == etag):
+        try:
+            byte_range = _parse_range(range_header, size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+        if byte_range is not None:
+            start, end = byte_range
+            length = end - start + 1
+            response = StreamingHttpResponse(
+                _stream(full_path, start, length), status=206, content_type=content_type
+            )
+            response['Content-Length'] = str(length)
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Accept-Ranges'] = 'bytes'
+            return response
+
+    # FileResponse lets the server use wsgi.file_wrapper/sendfile for the full body
+    response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+    response['Accept-Ranges'] = 'bytes'
+    return response